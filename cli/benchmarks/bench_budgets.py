@@ -0,0 +1,90 @@
+"""
+Benchmark: per-stage max_tokens budgets vs unbounded generation
+
+Runs full refinements over real HTTP against benchmarks/stub_server.py (see
+bench_suite.py), with a stub that always wants to write --completion-tokens
+tokens at --tokens-per-second, i.e. a model that rambles. Compares the
+default budgets (model.stage_max_tokens) with every stage unbounded
+(max_tokens=0 per request) and reports latency, completion tokens and how
+many calls were cut off.
+
+Usage:
+    python benchmarks/bench_budgets.py --completion-tokens 1200 --tokens-per-second 1000 --refines 10
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import stub_server
+from bench_suite import make_service, percentiles, running_stub
+from promptify.core.providerSelection.config import STAGES
+from promptify.core.providerSelection.providers import aclose_all
+from promptify.core.usage import empty_usage, add_usage
+
+RUNS = {
+    "unbounded": {stage: 0 for stage in STAGES},
+    "budgeted": None,  # The config's stage_max_tokens defaults
+}
+
+
+async def run_budget(service, max_tokens, refines: int, concurrency: int) -> tuple:
+    """(latencies, summed usage) for `refines` refinements with the given budgets"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    usage = empty_usage()
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await service.arefine(f"benchmark prompt {i}: build a todo app with auth", use_cache=False,
+                                           max_tokens=max_tokens)
+            latencies.append(time.perf_counter() - start)
+            add_usage(usage, result["total_usage"])
+
+    await asyncio.gather(*(one(i) for i in range(refines)))
+    await aclose_all()
+    return latencies, usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--refines", type=int, default=10, help="Refinements per run")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Provider call timeout (seconds)")
+    stub_server.add_arguments(parser)
+    parser.set_defaults(latency_ms=200.0, completion_tokens=1200, tokens_per_second=1000.0)
+    args = parser.parse_args()
+
+    results = {}
+    workdir = Path(tempfile.mkdtemp(prefix="promptify-bench-"))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with running_stub(args) as base_url:
+            service = make_service(base_url, args.timeout, workdir)
+            for name, max_tokens in RUNS.items():
+                asyncio.run(run_budget(service, max_tokens, 2, 2))  # Warm up imports and connections
+                results[name] = asyncio.run(run_budget(service, max_tokens, args.refines, args.concurrency))
+
+    print(f"\nStub: {args.latency_ms:g}ms to first token, {args.completion_tokens} tokens wanted per reply "
+          f"at {args.tokens_per_second:g} tokens/s; {args.refines} refines per run at concurrency {args.concurrency}")
+    for name, (latencies, usage) in results.items():
+        lat = percentiles(latencies)
+        print(f"  {name:<9} p50 {lat['p50_ms']:>8.1f}ms  p90 {lat['p90_ms']:>8.1f}ms  "
+              f"calls {usage['calls'] / args.refines:.1f}  "
+              f"completion {usage['completion_tokens'] / args.refines:.0f} tokens/refine  "
+              f"truncated {usage['truncated']}/{usage['calls']} calls")
+
+    unbounded_p50 = statistics.median(results["unbounded"][0])
+    budgeted_p50 = statistics.median(results["budgeted"][0])
+    unbounded_tokens = results["unbounded"][1]["completion_tokens"]
+    budgeted_tokens = results["budgeted"][1]["completion_tokens"]
+    print(f"  budgeted vs unbounded: latency {budgeted_p50 / unbounded_p50 - 1:+.0%}, "
+          f"completion tokens {budgeted_tokens / unbounded_tokens - 1:+.0%}")
+
+
+if __name__ == "__main__":
+    main()
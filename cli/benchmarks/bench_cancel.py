@@ -0,0 +1,83 @@
+"""
+Check: closing a batch stops its refinements
+
+Starts PromptifyService.arefine_many over many items against a stubbed
+provider, takes the first result and closes the iterator, as a client
+that disconnects from /refine/batch does. No provider call may start
+after the close; calls already in flight must be cancelled rather than
+completed. Exits 1 otherwise.
+
+Usage:
+    python benchmarks/bench_cancel.py --items 50 --concurrency 8
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+from types import SimpleNamespace
+
+import litellm
+
+from promptify.agent.graph import promptify
+from promptify.core.service import PromptifyService
+
+
+def stub_completion(latency: float, counts: dict):
+    """Fake litellm.acompletion that counts started, finished and cancelled calls"""
+    async def completion(messages, **kwargs):
+        counts["started"] += 1
+        try:
+            await asyncio.sleep(latency)
+        except asyncio.CancelledError:
+            counts["cancelled"] += 1
+            raise
+        counts["finished"] += 1
+        message = SimpleNamespace(content="ARCHITECT")
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=1)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage)
+    return completion
+
+
+async def run(service: PromptifyService, items: int, concurrency: int, latency: float, counts: dict) -> dict:
+    batch = service.arefine_many(
+        ((str(i), f"build app #{i} with a login page") for i in range(items)),
+        concurrency=concurrency, model_provider="local", model_name="stub", use_cache=False
+    )
+    async for _ in batch:
+        break
+    await batch.aclose()
+    at_close = dict(counts)
+    await asyncio.sleep(latency * 10)  # Long enough for any surviving pipeline to make its next calls
+    return at_close
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake provider latency per call (seconds)")
+    args = parser.parse_args()
+
+    counts = {"started": 0, "finished": 0, "cancelled": 0}
+    litellm.acompletion = stub_completion(args.latency, counts)
+    service = PromptifyService(graph=promptify)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        at_close = asyncio.run(run(service, args.items, args.concurrency, args.latency, counts))
+
+    in_flight = at_close["started"] - at_close["finished"] - at_close["cancelled"]
+    started_after = counts["started"] - at_close["started"]
+    finished_after = counts["finished"] - at_close["finished"]
+    print(f"\n{args.items} items at concurrency {args.concurrency}, closed after the first result")
+    print(f"  provider calls at close    {at_close['started']} started, {in_flight} in flight")
+    print(f"  started after close        {started_after}")
+    print(f"  finished after close       {finished_after}")
+    if started_after or finished_after:
+        print("  FAIL: refinements kept running after the batch was closed")
+        sys.exit(1)
+    print("  OK")
+
+
+if __name__ == "__main__":
+    main()
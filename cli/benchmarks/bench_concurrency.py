@@ -0,0 +1,59 @@
+"""
+Benchmark: concurrent refinements on a single event loop
+
+Runs N refinements at once through PromptifyService.arefine against a
+stubbed provider. With an async pipeline the wall-clock stays close to a
+single refine instead of growing linearly with N.
+
+Usage:
+    python benchmarks/bench_concurrency.py --latency 0.5 --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+import litellm
+
+from promptify.agent.graph import promptify
+from promptify.core.service import PromptifyService
+
+
+def stub_completion(latency: float):
+    """Returns a fake litellm.acompletion that sleeps for `latency` seconds"""
+    async def completion(messages, **kwargs):
+        await asyncio.sleep(latency)
+        message = SimpleNamespace(content="ARCHITECT")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    return completion
+
+
+async def run(service: PromptifyService, concurrency: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        service.arefine(f"build app #{i}", model_provider="local", model_name="stub", use_cache=False)
+        for i in range(concurrency)
+    ))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake provider latency per call (seconds)")
+    parser.add_argument("--concurrency", type=int, default=200, help="Refinements in flight at once")
+    args = parser.parse_args()
+
+    litellm.acompletion = stub_completion(args.latency)
+    service = PromptifyService(graph=promptify)
+
+    single = asyncio.run(run(service, 1))
+    many = asyncio.run(run(service, args.concurrency))
+
+    print(f"\nProvider latency: {args.latency:.3f}s per call")
+    print(f"  1 refine            {single:.3f}s")
+    print(f"  {args.concurrency} concurrent    {many:.3f}s  "
+          f"({args.concurrency / many:.1f} refines/s)")
+
+
+if __name__ == "__main__":
+    main()
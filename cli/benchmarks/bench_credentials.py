@@ -0,0 +1,109 @@
+"""
+Check: per-request credentials under concurrency
+
+Fires N /refine requests at the backend app at once, each with its own API
+key, against a stubbed provider. Every provider call must carry the key of
+the request that triggered it, and os.environ must be left untouched.
+The keys must still share one pooled HTTP client rather than one each.
+Exits 1 on any mix-up.
+
+Usage:
+    python benchmarks/bench_credentials.py --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import litellm
+
+BACKEND_DIR = Path(__file__).resolve().parents[2] / "extension" / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+PROVIDER = "openai"
+KEY_ENV = "OPENAI_API_KEY"
+
+
+def stub_completion(latency: float, seen: list, http_clients: set):
+    """Fake litellm.acompletion that echoes the key it was called with"""
+    async def completion(messages, **kwargs):
+        api_key = kwargs.get("api_key")
+        client = kwargs.get("client")
+        if client is not None:
+            http_clients.add(id(client._client))
+            if client.api_key != api_key:
+                api_key = f"MISMATCH {api_key} != {client.api_key}"
+        seen.append(api_key)
+        await asyncio.sleep(latency)
+        message = SimpleNamespace(content=f"KEY:{api_key}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    return completion
+
+
+async def run(app, concurrency: int):
+    keys = [f"sk-user-{i}-{uuid.uuid4().hex}" for i in range(concurrency)]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        responses = await asyncio.gather(*(
+            client.post("/refine", json={
+                # Unrelated prompts, so no request is answered from another's cache
+                "prompt": f"request {uuid.uuid4().hex} {key}",
+                "model_provider": PROVIDER,
+                "model_name": "stub",
+                "api_key": key,
+            })
+            for key in keys
+        ))
+    return keys, responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=200, help="Requests in flight at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake provider latency per call (seconds)")
+    args = parser.parse_args()
+
+    seen, http_clients = [], set()
+    litellm.acompletion = stub_completion(args.latency, seen, http_clients)
+    env_before = os.environ.get(KEY_ENV)
+    # Keep the backend's log file out of the working tree
+    os.environ["PROMPTIFY_LOG_DIR"] = tempfile.mkdtemp(prefix="promptify-bench-logs-")
+
+    from main import app
+
+    start = time.perf_counter()
+    keys, responses = asyncio.run(run(app, args.concurrency))
+    elapsed = time.perf_counter() - start
+
+    failures = []
+    for key, response in zip(keys, responses):
+        if response.status_code != 200:
+            failures.append(f"{key}: HTTP {response.status_code} {response.text[:80]}")
+        elif response.json()["refined_prompt"] != f"KEY:{key}":
+            failures.append(f"{key}: got {response.json()['refined_prompt'][:80]}")
+    unknown = [k for k in seen if k not in set(keys)]
+    if os.environ.get(KEY_ENV) != env_before:
+        failures.append(f"{KEY_ENV} was modified")
+
+    print(f"\n{args.concurrency} concurrent requests in {elapsed:.2f}s, {len(seen)} provider calls")
+    print(f"  wrong key in response   {len(failures)}")
+    print(f"  unexpected provider key {len(unknown)}")
+    print(f"  pooled HTTP clients     {len(http_clients)}")
+    for line in (failures + unknown)[:10]:
+        print(f"    {line}")
+    if len(http_clients) != 1:
+        print(f"    {len(http_clients)} pooled HTTP clients for {args.concurrency} keys, expected 1")
+    if failures or unknown or len(http_clients) != 1:
+        print("  FAIL")
+        sys.exit(1)
+    print("  OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: sequential vs fan-out agent graph
+
+Stubs litellm.acompletion with a fixed-latency fake so the numbers reflect
+graph topology only (no network, no API key needed).
+
+Usage:
+    python benchmarks/bench_graph.py --latency 0.5 --runs 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+
+import litellm
+from langgraph.graph import StateGraph, START, END
+
+from promptify.agent.state import AgentState
+from promptify.core.providerSelection.config import PromptifyConfig
+from promptify.agent.node import triageAgent, criticAgent, expertAgent, promptSmith
+from promptify.agent.graph import create_promptify_graph
+
+
+def stub_completion(latency: float):
+    """Returns a fake litellm.acompletion that sleeps for `latency` seconds"""
+    async def completion(messages, **kwargs):
+        await asyncio.sleep(latency)
+        message = SimpleNamespace(content="ARCHITECT")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    return completion
+
+
+def create_sequential_graph():
+    """The previous strict triage -> critic -> expert -> smith chain"""
+    graph = StateGraph(AgentState)
+    graph.add_node("triage", triageAgent)
+    graph.add_node("critic", criticAgent)
+    graph.add_node("expert", expertAgent)
+    graph.add_node("smith", promptSmith)
+    graph.add_edge(START, "triage")
+    graph.add_edge("triage", "critic")
+    graph.add_edge("critic", "expert")
+    graph.add_edge("expert", "smith")
+    graph.add_edge("smith", END)
+    return graph.compile()
+
+
+def initial_state() -> dict:
+    cfg = PromptifyConfig()
+    cfg.triage.local_threshold = None  # Always call the (stub) LLM, so every stage costs one call
+    return {
+        "user_query": "build a flappy bird game in python",
+        "model_config": {"provider": "local", "model": "stub", "cache": False},
+        "config": cfg,
+        "intent": "",
+        "critique": None,
+        "expert_suggestions": "",
+        "final_prompt_draft": "",
+        "iteration_count": 0
+    }
+
+
+def measure(graph, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        asyncio.run(graph.ainvoke(initial_state()))
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake provider latency per call (seconds)")
+    parser.add_argument("--runs", type=int, default=5, help="Refinements per graph")
+    args = parser.parse_args()
+
+    litellm.acompletion = stub_completion(args.latency)
+
+    results = {
+        "sequential": measure(create_sequential_graph(), args.runs),
+        "fan-out": measure(create_promptify_graph(), args.runs),
+    }
+
+    print(f"\nProvider latency: {args.latency:.3f}s per call, {args.runs} runs each")
+    for name, timings in results.items():
+        print(f"  {name:<11} median {statistics.median(timings):.3f}s  min {min(timings):.3f}s")
+
+    saved = statistics.median(results["sequential"]) - statistics.median(results["fan-out"])
+    print(f"  saving      {saved:.3f}s per refine "
+          f"({saved / statistics.median(results['sequential']):.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: hedged provider calls
+
+Sends N calls through call_llm against a stubbed primary whose latency has
+a slow tail (a fraction of calls take --slow seconds), with hedging off and
+then on. The secondary preset answers in normal time. Prints p50/p90/p99
+per mode and the hedge counters.
+
+Usage:
+    python benchmarks/bench_hedge.py --calls 400 --slow-rate 0.05 --slow 2.0
+"""
+import argparse
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+import litellm
+from langchain_core.prompt_values import StringPromptValue
+
+from promptify.agent.node import call_llm
+from promptify.core.hedge import get_hedge_stats
+from promptify.core.providerSelection.config import PromptifyConfig, MODEL_PRESETS
+
+SECONDARY = "cerebras-70b"
+
+
+def stub_completion(base: float, slow: float, slow_rate: float):
+    """Fake litellm.acompletion: the primary has a slow tail, the secondary doesn't"""
+    secondary_model = MODEL_PRESETS[SECONDARY]["model"]
+
+    async def completion(messages, **kwargs):
+        latency = base * random.uniform(0.8, 1.2)
+        if kwargs["model"] != secondary_model and random.random() < slow_rate:
+            latency = slow
+        await asyncio.sleep(latency)
+        message = SimpleNamespace(content="ARCHITECT")
+        # Report usage like a real provider, so call_llm never has to count tokens itself
+        usage = SimpleNamespace(prompt_tokens=sum(len(m["content"]) for m in messages) // 4, completion_tokens=1)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage)
+    return completion
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+async def run(cfg: PromptifyConfig, calls: int, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await call_llm(StringPromptValue(text=f"call {i}"), cfg=cfg)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1, help="Typical provider latency (seconds)")
+    parser.add_argument("--slow", type=float, default=2.0, help="Latency of a slow primary call (seconds)")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Fraction of primary calls that are slow")
+    args = parser.parse_args()
+
+    litellm.acompletion = stub_completion(args.latency, args.slow, args.slow_rate)
+
+    cfg = PromptifyConfig()
+    cfg.model.provider = "local"
+    cfg.model.model = "stub"
+    cfg.model.cache = False
+    cfg.model.hedge.secondary = SECONDARY
+    cfg.model.hedge.min_samples = 20
+
+    print(f"\nPrimary latency ~{args.latency:.2f}s, {args.slow_rate:.0%} of calls take {args.slow:.1f}s")
+    for enabled in (False, True):
+        cfg.model.hedge.enabled = enabled
+        latencies = asyncio.run(run(cfg, args.calls, args.concurrency))
+        print(f"  hedge {'on ' if enabled else 'off'}  p50 {percentile(latencies, 0.5):.3f}s  "
+              f"p90 {percentile(latencies, 0.9):.3f}s  p99 {percentile(latencies, 0.99):.3f}s")
+
+    for name, stats in get_hedge_stats().items():
+        print(f"  {name}: fired {stats['fired']}/{stats['calls']} ({stats['fire_rate']:.1%}), "
+              f"secondary won {stats['secondary_wins']}, primary won {stats['primary_wins']}, "
+              f"p90 {stats['p90_seconds']:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
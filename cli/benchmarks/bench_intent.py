@@ -0,0 +1,97 @@
+"""
+Benchmark: local intent classifier vs LLM triage labels
+
+Scores promptify.core.intent.classify_intent against labelled queries and
+reports, per confidence threshold, the fraction of Triage calls it would
+skip and how often those skipped decisions match the label, plus the time
+per classification.
+
+Labels come from --data, a JSON lines file with "query" and "intent"
+(exactly what triage.log_path records from real LLM triage), or from the
+small hand-labelled sample below.
+
+Usage:
+    python benchmarks/bench_intent.py
+    python benchmarks/bench_intent.py --data ~/.promptify/triage.jsonl --thresholds 0.5,0.67,0.75,0.8
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from promptify.core.intent import classify_intent
+
+SAMPLE = [
+    ("Design a scalable architecture for a food delivery platform", "ARCHITECT"),
+    ("How should we structure microservices for an e-commerce site?", "ARCHITECT"),
+    ("Plan the roadmap for migrating our monolith to the cloud", "ARCHITECT"),
+    ("What tech stack and infrastructure would you pick for a realtime chat app", "ARCHITECT"),
+    ("I need a strategy for rolling out feature flags across 40 services", "ARCHITECT"),
+    ("build a todo app with auth", "ARCHITECT"),
+    ("Write a python script that renames files by date", "BUILDER"),
+    ("Generate a regex that matches ISO dates", "BUILDER"),
+    ("Fix my SQL query, it returns duplicates", "BUILDER"),
+    ("Create a React component for a paginated table", "BUILDER"),
+    ("Draft a cold email to a potential investor", "BUILDER"),
+    ("Implement binary search in Rust", "BUILDER"),
+    ("Convert this bash script to python", "BUILDER"),
+    ("Explain how garbage collection works in Java", "MENTOR"),
+    ("What is the difference between TCP and UDP?", "MENTOR"),
+    ("teach me recursion like I'm a beginner", "MENTOR"),
+    ("Why does my closure capture the last loop value?", "MENTOR"),
+    ("How does HTTPS work under the hood", "MENTOR"),
+    ("help me understand monads", "MENTOR"),
+    ("Review this pull request for security issues", "ANALYST"),
+    ("Analyze our churn data and tell me what stands out", "ANALYST"),
+    ("Critique my essay's argument structure", "ANALYST"),
+    ("find the bugs in this function", "ANALYST"),
+    ("Can you give me feedback on my resume?", "ANALYST"),
+    ("Audit the accessibility of our signup form", "ANALYST"),
+    ("Something is off with our build, any ideas?", "ANALYST"),
+]
+
+
+def load(path: Path) -> list:
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            examples.append((record["query"], record["intent"].upper()))
+    return examples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", type=Path, help="JSON lines with query and intent (e.g. triage.log_path output)")
+    parser.add_argument("--thresholds", default="0.5,0.67,0.75,0.8", help="Confidence thresholds to evaluate")
+    parser.add_argument("--repeat", type=int, default=200, help="Passes over the data for the timing")
+    args = parser.parse_args()
+
+    examples = load(args.data) if args.data else SAMPLE
+    predictions = [classify_intent(query) for query, _ in examples]
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for query, _ in examples:
+            classify_intent(query)
+    per_call_us = (time.perf_counter() - start) / (args.repeat * len(examples)) * 1e6
+
+    correct = sum(intent == label for (intent, _), (_, label) in zip(predictions, examples))
+    print(f"\n{len(examples)} labelled queries ({args.data or 'built-in sample'})")
+    print(f"  classify_intent   {per_call_us:.1f}µs per query")
+    print(f"  agreement (all)   {correct / len(examples):.0%}")
+
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        skipped = [(intent, label) for (intent, confidence), (_, label) in zip(predictions, examples)
+                   if confidence >= threshold]
+        agreed = sum(intent == label for intent, label in skipped)
+        rate = f"{agreed / len(skipped):.0%}" if skipped else "-"
+        print(f"  threshold {threshold:<5g}  skips {len(skipped) / len(examples):>4.0%} of LLM calls, "
+              f"agreement on skipped {rate} ({agreed}/{len(skipped)})")
+
+
+if __name__ == "__main__":
+    main()
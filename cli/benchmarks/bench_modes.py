@@ -0,0 +1,82 @@
+"""
+Benchmark: full (four-agent) vs fast (analysis + Smith) refinement mode
+
+Runs both modes over real HTTP against benchmarks/stub_server.py (see
+bench_suite.py) and reports latency and token usage per refine. Prompt
+tokens reflect the real prompts sent; completion tokens are the stub's
+fixed reply length per call, so they mostly count calls.
+
+Usage:
+    python benchmarks/bench_modes.py --latency-ms 400 --refines 20 --concurrency 4
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import stub_server
+from bench_suite import make_service, percentiles, running_stub
+from promptify.core.providerSelection.providers import aclose_all
+from promptify.core.usage import empty_usage, add_usage
+
+MODES = ("full", "fast")
+
+
+async def run_mode(service, mode: str, refines: int, concurrency: int) -> tuple:
+    """(latencies, summed usage) for `refines` refinements in `mode`"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    usage = empty_usage()
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await service.arefine(f"benchmark prompt {i}: build a todo app with auth", use_cache=False, mode=mode)
+            latencies.append(time.perf_counter() - start)
+            add_usage(usage, result["total_usage"])
+
+    await asyncio.gather(*(one(i) for i in range(refines)))
+    await aclose_all()
+    return latencies, usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--refines", type=int, default=20, help="Refinements per mode")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Provider call timeout (seconds)")
+    stub_server.add_arguments(parser)
+    parser.set_defaults(latency_ms=400.0)
+    args = parser.parse_args()
+
+    results = {}
+    workdir = Path(tempfile.mkdtemp(prefix="promptify-bench-"))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with running_stub(args) as base_url:
+            service = make_service(base_url, args.timeout, workdir)
+            for mode in MODES:
+                asyncio.run(run_mode(service, mode, 2, 2))  # Warm up imports and connections
+                results[mode] = asyncio.run(run_mode(service, mode, args.refines, args.concurrency))
+
+    print(f"\nStub: {args.latency_dist} {args.latency_ms:g}ms median per call, "
+          f"{args.refines} refines per mode at concurrency {args.concurrency}")
+    for mode, (latencies, usage) in results.items():
+        lat = percentiles(latencies)
+        per = {field: usage[field] / args.refines for field in ("calls", "prompt_tokens", "completion_tokens", "total_tokens")}
+        print(f"  {mode:<5} p50 {lat['p50_ms']:>8.1f}ms  p90 {lat['p90_ms']:>8.1f}ms  "
+              f"calls {per['calls']:.1f}  prompt {per['prompt_tokens']:.0f}  "
+              f"completion {per['completion_tokens']:.0f}  total {per['total_tokens']:.0f} tokens/refine")
+
+    full_p50 = statistics.median(results["full"][0])
+    fast_p50 = statistics.median(results["fast"][0])
+    full_tokens = results["full"][1]["total_tokens"]
+    fast_tokens = results["fast"][1]["total_tokens"]
+    print(f"  fast vs full: latency {fast_p50 / full_p50 - 1:+.0%}, tokens {fast_tokens / full_tokens - 1:+.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Check: shared rate-limit budget across processes
+
+Starts several processes that each fire calls through call_llm as fast as
+they can, all sharing one requests-per-minute budget (in a temporary
+SQLite store) against a stubbed provider. After the initial burst of one
+minute's budget, the combined rate must stay at or under the budget.
+Calls are timed by when the limiter granted them, not when they finished,
+so process start-up and scheduling on a busy host don't skew the check.
+Prints the achieved rate and the wait time each process reported; exits 1
+if the budget was exceeded.
+
+Usage:
+    python benchmarks/bench_ratelimit.py --processes 4 --calls 350 --rpm 1200
+"""
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+
+def worker(store: str, rpm: int, calls: int, barrier, results) -> None:
+    import litellm
+    from langchain_core.prompt_values import StringPromptValue
+    from promptify.agent.node import call_llm
+    from promptify.core.providerSelection.config import PromptifyConfig, RateLimitConfig
+    from promptify.core.providerSelection.ratelimit import RateLimiter, get_rate_limit_stats
+
+    async def completion(messages, **kwargs):
+        await asyncio.sleep(0.005)
+        message = SimpleNamespace(content="ARCHITECT")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    litellm.acompletion = completion
+
+    cfg = PromptifyConfig()
+    cfg.model.provider = "local"
+    cfg.model.model = "stub"
+    cfg.model.cache = False
+    cfg.model.rate_limits = {"local": RateLimitConfig(requests_per_minute=rpm)}
+    cfg.model.rate_limit_path = store
+
+    # Record when each request was granted (the limiter's own clock)
+    timestamps = []
+    take = RateLimiter._take
+
+    def recording_take(self, name, amount, per_minute):
+        granted_at = take(self, name, amount, per_minute)
+        timestamps.append(granted_at)
+        return granted_at
+    RateLimiter._take = recording_take
+
+    async def run():
+        await asyncio.gather(*(call_llm(StringPromptValue(text=f"call {i}"), cfg=cfg) for i in range(calls)))
+
+    barrier.wait()  # Start together, after the (slow) imports
+    asyncio.run(run())
+    results.put((timestamps, get_rate_limit_stats().get("local", {})))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--calls", type=int, default=350, help="Calls per process")
+    parser.add_argument("--rpm", type=int, default=1200, help="Shared requests-per-minute budget")
+    args = parser.parse_args()
+
+    store = str(Path(tempfile.mkdtemp()) / "ratelimit.sqlite3")
+    results = multiprocessing.Queue()
+    barrier = multiprocessing.Barrier(args.processes)
+    procs = [multiprocessing.Process(target=worker, args=(store, args.rpm, args.calls, barrier, results))
+             for _ in range(args.processes)]
+    for p in procs:
+        p.start()
+    outputs = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    timestamps = sorted(t for stamps, _ in outputs for t in stamps)
+    total = len(timestamps)
+    elapsed = timestamps[-1] - timestamps[0]
+    rate = args.rpm / 60.0
+    # Burst: one minute's budget up front, then `rate` per second
+    allowed = args.rpm + rate * elapsed
+    minimum = max(0.0, (total - args.rpm) / rate)
+
+    print(f"\n{args.processes} processes x {args.calls} calls, shared budget {args.rpm} rpm")
+    print(f"  finished in {elapsed:.2f}s (at least {minimum:.2f}s expected), {total} calls")
+    for i, (_, stats) in enumerate(outputs):
+        print(f"  process {i}: waited on {stats.get('waited', 0)}/{stats.get('acquired', 0)} calls, "
+              f"{stats.get('wait_seconds', 0):.1f}s total, max {stats.get('max_wait_seconds', 0):.2f}s")
+    if total > allowed * 1.02 or elapsed < minimum * 0.95:
+        print("  FAIL: budget exceeded")
+        sys.exit(1)
+    print("  OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Startup-time regression check for lightweight CLI commands
+
+Imports promptify.cli under `python -X importtime` and fails (exit 1) if
+the import exceeds the budget or pulls in any heavy dependency that
+should only load inside the commands that need it. Also times
+`promptify version` end to end.
+
+Usage:
+    python benchmarks/bench_startup.py --budget-ms 400
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Must not be imported just to parse the command line
+HEAVY_MODULES = ("langgraph", "langchain_core", "litellm", "textual", "promptmasker")
+
+
+def import_profile() -> dict:
+    """Cumulative import time in microseconds for each top-level package"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import promptify.cli"],
+        capture_output=True, text=True, check=True
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = line.split("|")
+        name = name.strip()
+        if cum.strip().isdigit():
+            cumulative[name] = int(cum)
+    return cumulative
+
+
+def time_command(args: list, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "promptify.cli", *args], capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=400, help="Max cumulative import time of promptify.cli")
+    parser.add_argument("--runs", type=int, default=3, help="Runs of `promptify version` to time")
+    args = parser.parse_args()
+
+    profile = import_profile()
+    cli_ms = profile.get("promptify.cli", 0) / 1000
+    heavy = sorted(name for name in profile if name.split(".")[0] in HEAVY_MODULES and "." not in name)
+
+    print(f"\nimport promptify.cli    {cli_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"promptify version       {time_command(['version'], args.runs) * 1000:.0f} ms wall-clock")
+
+    failures = []
+    if cli_ms > args.budget_ms:
+        failures.append(f"import took {cli_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+
+    for failure in failures:
+        print(f"  FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("  OK")
+
+
+if __name__ == "__main__":
+    main()
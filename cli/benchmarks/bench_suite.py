@@ -0,0 +1,232 @@
+"""
+Benchmark suite: full refinements against a local stub provider
+
+Starts benchmarks/stub_server.py on a free local port, points the `local`
+provider (OpenAICompatibleProvider) at it and measures, over real HTTP:
+
+  latency      refine latency percentiles at a fixed concurrency
+  throughput   refines/s at several concurrency levels
+  overhead     pipeline time excluding model time (stub answering instantly)
+  errors       refines that still failed after retries (with --rate-* injection)
+
+Results are written as JSON; pass --compare to diff against an earlier run.
+Needs no network and no API key.
+
+Usage:
+    python benchmarks/bench_suite.py -o bench.json
+    python benchmarks/bench_suite.py --latency-ms 300 --rate-429 0.05 --rate-5xx 0.02 -o bench.json
+    python benchmarks/bench_suite.py -o new.json --compare old.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import stub_server
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def running_stub(args: argparse.Namespace, **overrides):
+    """Run the stub server in a subprocess so it doesn't share our event loop or GIL"""
+    port = free_port()
+    settings = {**vars(stub_server.settings_from_args(args)), **overrides}
+    cmd = [sys.executable, str(BENCH_DIR / "stub_server.py"), "--port", str(port)]
+    for name, value in settings.items():
+        if value is not None:
+            cmd += [f"--{name.replace('_', '-')}", str(value)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    try:
+        proc.stdout.readline()  # "listening on ..."
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def stub_stats(base_url: str) -> dict:
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as response:
+        return json.load(response)
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 2)
+    return {"count": len(ordered), "p50_ms": pick(0.5), "p90_ms": pick(0.9), "p99_ms": pick(0.99),
+            "max_ms": round(ordered[-1] * 1000, 2), "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2)}
+
+
+def make_service(base_url: str, timeout: float, workdir: Path):
+    """A service whose config (./config.yml in `workdir`) targets the stub"""
+    from promptify.agent.graph import promptify, get_fast_graph
+    from promptify.core.providerSelection.config import PromptifyConfig
+    from promptify.core.service import PromptifyService
+
+    cfg = PromptifyConfig()
+    cfg.model.provider = "local"
+    cfg.model.model = "stub"
+    cfg.model.api_base = f"{base_url}/v1"
+    cfg.model.cache = False
+    cfg.model.timeout = timeout
+    cfg.model.retry.base_delay = 0.05
+    cfg.model.retry.max_delay = 2.0
+    # config.yml in the working directory wins over the user's ~/.promptify config
+    cfg.save(workdir / "config.yml")
+    os.chdir(workdir)
+    return PromptifyService(graph=promptify, fast_graph=get_fast_graph())
+
+
+async def run_refines(service, total: int, concurrency: int) -> tuple:
+    """(latencies of successful refines, error count, wall-clock seconds)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await service.arefine(f"benchmark prompt {i}: build a todo app with auth", use_cache=False)
+            except Exception as e:
+                errors.append(type(e).__name__)
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    from promptify.core.providerSelection.providers import aclose_all
+    await aclose_all()
+    return latencies, errors, elapsed
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCH_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(new: dict, old: dict) -> None:
+    """Print the change in the headline numbers between two result files"""
+    def delta(label, a, b, higher_is_better=False):
+        if a is None or b is None or not b:
+            return
+        change = (a - b) / b * 100
+        worse = change < 0 if higher_is_better else change > 0
+        flag = "  <-- regression" if worse and abs(change) > 10 else ""
+        print(f"  {label:<28} {b:>10.2f} -> {a:>10.2f}  ({change:+.1f}%){flag}")
+
+    print(f"\nCompared with {old['meta'].get('commit')} ({old['meta'].get('timestamp')}):")
+    for key in ("p50_ms", "p90_ms", "p99_ms"):
+        delta(f"latency {key}", new["latency"].get(key), old["latency"].get(key))
+    old_tp = {row["concurrency"]: row for row in old.get("throughput", [])}
+    for row in new["throughput"]:
+        if row["concurrency"] in old_tp:
+            delta(f"throughput c={row['concurrency']} (/s)", row["refines_per_second"],
+                  old_tp[row["concurrency"]]["refines_per_second"], higher_is_better=True)
+    delta("overhead per refine (ms)", new["overhead"].get("p50_ms"), old["overhead"].get("p50_ms"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", type=Path, default=Path("bench-results.json"))
+    parser.add_argument("--compare", type=Path, help="Earlier result file to diff against")
+    parser.add_argument("--refines", type=int, default=100, help="Refines for the latency run")
+    parser.add_argument("--latency-concurrency", type=int, default=8)
+    parser.add_argument("--levels", default="1,8,32,128", help="Concurrency levels for the throughput run")
+    parser.add_argument("--refines-per-level", type=int, default=128)
+    parser.add_argument("--timeout", type=float, default=2.0, help="Provider call timeout (seconds)")
+    stub_server.add_arguments(parser)
+    args = parser.parse_args()
+    if args.timeout_hang <= args.timeout:
+        args.timeout_hang = args.timeout * 5
+
+    levels = [int(level) for level in args.levels.split(",")]
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "stub": vars(stub_server.settings_from_args(args)),
+            "timeout": args.timeout,
+        }
+    }
+
+    # Resolve before make_service changes directory
+    args.output = args.output.resolve()
+    args.compare = args.compare.resolve() if args.compare else None
+    workdir = Path(tempfile.mkdtemp(prefix="promptify-bench-"))
+
+    # Agent status lines would swamp the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with running_stub(args) as base_url:
+            service = make_service(base_url, args.timeout, workdir)
+            asyncio.run(run_refines(service, 4, 4))  # Warm up imports and connections
+
+            latencies, errors, _ = asyncio.run(run_refines(service, args.refines, args.latency_concurrency))
+            results["latency"] = {"concurrency": args.latency_concurrency, **percentiles(latencies)}
+            results["errors"] = {"failed_refines": len(errors), "by_type": {e: errors.count(e) for e in set(errors)}}
+
+            results["throughput"] = []
+            for level in levels:
+                latencies, errors, elapsed = asyncio.run(run_refines(service, args.refines_per_level, level))
+                results["throughput"].append({
+                    "concurrency": level,
+                    "refines": len(latencies),
+                    "failed": len(errors),
+                    "seconds": round(elapsed, 3),
+                    "refines_per_second": round(len(latencies) / elapsed, 2),
+                    **percentiles(latencies),
+                })
+            results["errors"]["stub"] = stub_stats(base_url)
+
+        # Same pipeline with the model answering instantly: what remains is our overhead
+        with running_stub(args, latency_ms=0.0, latency_dist="fixed", tokens_per_second=0.0,
+                          rate_429=0.0, rate_5xx=0.0, rate_timeout=0.0) as base_url:
+            service = make_service(base_url, args.timeout, workdir)
+            asyncio.run(run_refines(service, 4, 4))
+            latencies, _, _ = asyncio.run(run_refines(service, args.refines, 1))
+            results["overhead"] = {"model_calls_per_refine": 4, **percentiles(latencies)}
+
+    args.output.write_text(json.dumps(results, indent=2))
+
+    lat = results["latency"]
+    print(f"\nStub: {args.latency_dist} {args.latency_ms:g}ms median, "
+          f"429 {args.rate_429:.0%} / 5xx {args.rate_5xx:.0%} / timeout {args.rate_timeout:.0%}")
+    print(f"  latency  (c={lat['concurrency']})   p50 {lat.get('p50_ms')}ms  p90 {lat.get('p90_ms')}ms  p99 {lat.get('p99_ms')}ms")
+    for row in results["throughput"]:
+        print(f"  throughput c={row['concurrency']:<4} {row['refines_per_second']:>8.2f} refines/s  "
+              f"p99 {row.get('p99_ms')}ms  failed {row['failed']}")
+    print(f"  overhead (model time excluded)  p50 {results['overhead'].get('p50_ms')}ms per refine")
+    print(f"  failed refines {results['errors']['failed_refines']}  stub injected {results['errors']['stub']['injected']}")
+    print(f"  -> {args.output}")
+
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+OpenAI-compatible stub server for offline benchmarks
+
+Serves POST /v1/chat/completions (plain and stream=true) with a configurable
+latency distribution, token rate and injected failures, plus GET /stats with
+request counters. Standard library only, so it runs on a bare Linux box
+without network access.
+
+Usage:
+    python benchmarks/stub_server.py --port 8765 --latency-ms 200 --latency-dist lognormal \
+        --tokens-per-second 400 --rate-429 0.05 --rate-5xx 0.02 --rate-timeout 0.01
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+REPLY_WORDS = ("ARCHITECT", "Define", "the", "scope,", "constraints", "and", "acceptance", "criteria.")
+
+
+@dataclass
+class StubSettings:
+    latency_ms: float = 100.0           # Median time to first token
+    latency_dist: str = "lognormal"     # fixed | uniform | exponential | lognormal
+    latency_sigma: float = 0.5          # lognormal shape (larger = heavier tail)
+    tokens_per_second: float = 0.0      # Completion token rate; 0 = instant
+    completion_tokens: int = 40
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    rate_timeout: float = 0.0           # Accept, then never answer within timeout_hang
+    timeout_hang: float = 30.0
+    retry_after: float = 0.2            # Retry-After seconds sent with 429s
+    seed: Optional[int] = None
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    ok: int = 0
+    injected: Dict[str, int] = field(default_factory=lambda: {"429": 0, "5xx": 0, "timeout": 0})
+
+
+class StubServer:
+    """Minimal HTTP/1.1 keep-alive server speaking enough of the OpenAI chat API"""
+
+    def __init__(self, settings: StubSettings):
+        self.settings = settings
+        self.stats = StubStats()
+        self.random = random.Random(settings.seed)
+
+    def first_token_delay(self) -> float:
+        s = self.settings
+        median = s.latency_ms / 1000
+        if s.latency_dist == "fixed":
+            return median
+        if s.latency_dist == "uniform":
+            return self.random.uniform(0, 2 * median)
+        if s.latency_dist == "exponential":
+            return self.random.expovariate(math.log(2) / median) if median > 0 else 0.0
+        return self.random.lognormvariate(math.log(median), s.latency_sigma) if median > 0 else 0.0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if method == "GET" and path == "/stats":
+                    await self.respond(writer, 200, {"requests": self.stats.requests, "ok": self.stats.ok,
+                                                     "injected": self.stats.injected})
+                elif method == "POST" and path.endswith("/chat/completions"):
+                    await self.chat(writer, json.loads(body or b"{}"))
+                else:
+                    await self.respond(writer, 404, {"error": {"message": "not found"}})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+        body = json.dumps(payload).encode()
+        head = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                "Content-Type: application/json", f"Content-Length: {len(body)}"]
+        head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    async def chat(self, writer, request: dict) -> None:
+        s = self.settings
+        self.stats.requests += 1
+
+        roll = self.random.random()
+        if roll < s.rate_429:
+            self.stats.injected["429"] += 1
+            await self.respond(writer, 429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                               {"Retry-After": f"{s.retry_after:g}"})
+            return
+        roll -= s.rate_429
+        if roll < s.rate_5xx:
+            self.stats.injected["5xx"] += 1
+            await self.respond(writer, 503, {"error": {"message": "Service unavailable", "type": "server_error"}})
+            return
+        roll -= s.rate_5xx
+        if roll < s.rate_timeout:
+            self.stats.injected["timeout"] += 1
+            await asyncio.sleep(s.timeout_hang)
+            return
+
+        await asyncio.sleep(self.first_token_delay())
+        # Honour max_tokens like a real provider: stop there with finish_reason "length"
+        limit = request.get("max_tokens") or request.get("max_completion_tokens")
+        length = min(s.completion_tokens, limit) if limit else s.completion_tokens
+        finish_reason = "length" if length < s.completion_tokens else "stop"
+        words = [REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(length)]
+        per_token = 1 / s.tokens_per_second if s.tokens_per_second > 0 else 0.0
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", [])) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+        model = request.get("model", "stub")
+
+        if request.get("stream"):
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+            for i, word in enumerate(words):
+                if per_token:
+                    await asyncio.sleep(per_token)
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                         "choices": [{"index": 0, "delta": {"content": word + " "},
+                                      "finish_reason": finish_reason if i == len(words) - 1 else None}]}
+                self.write_chunk(writer, f"data: {json.dumps(chunk)}\n\n")
+                await writer.drain()
+            if (request.get("stream_options") or {}).get("include_usage"):
+                # Like OpenAI: a last chunk with no choices carrying the usage
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                         "choices": [], "usage": usage}
+                self.write_chunk(writer, f"data: {json.dumps(chunk)}\n\n")
+            self.write_chunk(writer, "data: [DONE]\n\n")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        else:
+            await asyncio.sleep(per_token * len(words))
+            await self.respond(writer, 200, {
+                "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                             "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+        self.stats.ok += 1
+
+    @staticmethod
+    def write_chunk(writer, text: str) -> None:
+        data = text.encode()
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+
+async def serve(settings: StubSettings, host: str = "127.0.0.1", port: int = 8765) -> None:
+    server = await asyncio.start_server(StubServer(settings).handle, host, port)
+    print(f"stub server listening on http://{host}:{port}/v1", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Stub settings as CLI flags (shared with bench_suite.py)"""
+    defaults = StubSettings()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="Median latency to first token")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "exponential", "lognormal"], default=defaults.latency_dist)
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma, help="Lognormal shape")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second, help="0 = instant")
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens)
+    parser.add_argument("--rate-429", type=float, default=defaults.rate_429, help="Fraction of calls answered 429")
+    parser.add_argument("--rate-5xx", type=float, default=defaults.rate_5xx, help="Fraction of calls answered 503")
+    parser.add_argument("--rate-timeout", type=float, default=defaults.rate_timeout, help="Fraction of calls that hang")
+    parser.add_argument("--timeout-hang", type=float, default=defaults.timeout_hang)
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def settings_from_args(args: argparse.Namespace) -> StubSettings:
+    return StubSettings(**{name: getattr(args, name) for name in StubSettings.__dataclass_fields__})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(settings_from_args(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
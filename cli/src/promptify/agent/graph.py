@@ -1,6 +1,6 @@
 from langgraph.graph import StateGraph, START, END
 from .state import AgentState
-from .node import triageAgent, criticAgent, expertAgent, promptSmith
+from .node import triageAgent, criticAgent, expertAgent, promptSmith, fastAnalyzer
 
 def create_promptify_graph():
     """Builds and compiles the Promptify agent graph"""
@@ -13,13 +13,56 @@ def create_promptify_graph():
     graph.add_node("smith", promptSmith)
     
     # Define flow
+    # Triage and Critic only read the user query, so they fan out from START
+    # and run concurrently; Expert waits for both before it starts.
     graph.add_edge(START, "triage")
-    graph.add_edge("triage", "critic")
-    graph.add_edge("critic", "expert")
+    graph.add_edge(START, "critic")
+    graph.add_edge(["triage", "critic"], "expert")
     graph.add_edge("expert", "smith")
     graph.add_edge("smith", END)
     
     return graph.compile()
 
-# Export compiled graph
-promptify = create_promptify_graph()
\ No newline at end of file
+
+def create_fast_graph():
+    """
+    Builds and compiles the two-call "fast" graph: one structured call fills
+    intent, critique and expert_suggestions, then Smith writes the prompt.
+    Produces the same AgentState fields as the full graph.
+    """
+    graph = StateGraph(AgentState)
+    
+    graph.add_node("analyze", fastAnalyzer)
+    graph.add_node("smith", promptSmith)
+    
+    graph.add_edge(START, "analyze")
+    graph.add_edge("analyze", "smith")
+    graph.add_edge("smith", END)
+    
+    return graph.compile()
+
+_compiled = None
+_compiled_fast = None
+
+
+def get_promptify_graph():
+    """The compiled Promptify graph, built on first use"""
+    global _compiled
+    if _compiled is None:
+        _compiled = create_promptify_graph()
+    return _compiled
+
+
+def get_fast_graph():
+    """The compiled fast-mode graph, built on first use"""
+    global _compiled_fast
+    if _compiled_fast is None:
+        _compiled_fast = create_fast_graph()
+    return _compiled_fast
+
+
+def __getattr__(name):
+    # Export compiled graph lazily: `from promptify.agent.graph import promptify`
+    if name == "promptify":
+        return get_promptify_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,23 +1,63 @@
+import json
+import random
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Optional, Tuple
+
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableLambda
+from langgraph.types import StreamWriter
 import litellm
 
+# Retries print their own one-line notice; skip litellm's multi-line banner per failure
+litellm.suppress_debug_info = True
+
 # Import our custom provider selection logic
-from promptify.core.providerSelection.config import PromptifyConfig
+from promptify.core.providerSelection.config import PromptifyConfig, MODEL_PRESETS
 from promptify.core.providerSelection.providers import get_provider
+from promptify.core.providerSelection.ratelimit import get_rate_limiter, estimate_tokens, approx_tokens
+from promptify.core.cache import get_llm_cache, make_cache_key
+from promptify.core.retry import call_with_retries
+from promptify.core.hedge import hedged_call, hedge_delay
+from promptify.core.usage import collect_usage, record_usage
+from promptify.core.intent import classify_intent, record_triage, log_triage
+from promptify.core.metrics import (
+    track, STAGE_DURATION, STAGE_ERRORS, STAGE_IN_FLIGHT, LLM_DURATION, LLM_ERRORS, LLM_IN_FLIGHT, LLM_TRUNCATED
+)
+from promptify.utils.errors import ConfigurationError
 
 from promptify.prompt.TriageAgentPrompt import TRIAGE_AGENT_PROMPT
 from promptify.prompt.CriticAgentPrompt import CRITIQUE_AGENT_PROMPT
 from promptify.prompt.expertAgentPrompt import EXPERT_AGENT_PROMPT
 from promptify.prompt.promptSmith import PROMPT_SMITH_PROMPT
+from promptify.prompt.fastAnalysisPrompt import FAST_ANALYSIS_PROMPT
 from promptify.agent.state import AgentState
 
+# Stage whose node is running, so call_llm can apply its model.stages route
+_current_stage: ContextVar[Optional[str]] = ContextVar("promptify_stage", default=None)
+
 
-def call_llm(prompt_value, config: dict = None) -> str:
+async def call_llm(prompt_value, config: dict = None, cfg: PromptifyConfig = None, on_token: Optional[Callable[[str], None]] = None) -> str:
     """
     Custom Runnable that takes a LangChain PromptValue,
     converts it to LiteLLM messages, selects the provider from config,
     and returns the string response.
+
+    `cfg` is the PromptifyConfig resolved once per refine; it is only
+    loaded here when call_llm is used outside the graph.
+
+    Async so that a single event loop can keep many refinements in flight
+    while they wait on the provider. When `on_token` is given the response
+    is streamed and each text delta is passed to it as it arrives.
+
+    Transient failures are retried per the provider's RetryConfig; the
+    final failure is raised as an APIError (status_code, retry_after).
+    With model.hedge enabled, a slow non-streaming call is raced against
+    the hedge.secondary preset and the first answer wins.
+    
+    Output is capped at the stage's max_tokens budget (config["max_tokens"]
+    per stage, else the config's route; model.max_tokens caps both); a reply
+    cut off there is counted in the stage's usage as truncated and is not cached.
     """
     # 1. Convert LangChain PromptValue to standard list-of-dicts messages
     messages = []
@@ -33,56 +73,286 @@ def call_llm(prompt_value, config: dict = None) -> str:
         messages.append({"role": role, "content": m.content})
 
     # 2. Load Configuration (defaults to Cerebras/Free if file not found)
-    try:
-        cfg = PromptifyConfig.load()
-    except Exception as e:
-        print(f"⚠️ [Config] Warning: {e}. Using defaults.")
-        cfg = PromptifyConfig()
+    if cfg is None:
+        cfg = PromptifyConfig.load_or_default()
     
     # 3. Prepare Provider Arguments
+    # The running stage may route to its own provider/model (model.stages).
+    # A request that names a provider or model pins those for every stage,
+    # though the stage still sets temperature and max_tokens.
+    stage_name = _current_stage.get()
+    route = cfg.model.stage_route(stage_name)
+    requested_provider = config.get("provider") if config else None
+    requested_model = config.get("model") if config else None
+    if requested_provider or requested_model:
+        # Callers pass provider=None to mean "use the configured one"
+        provider_name = requested_provider or cfg.model.provider
+        model = requested_model or cfg.model.model
+        stage_api_base = None
+    else:
+        provider_name = route["provider"]
+        model = route["model"]
+        stage_api_base = route["api_base"]
+
     # Start with defaults from loaded config
     provider_kwargs = {
-        "model": cfg.model.model,
-        "temperature": cfg.model.temperature,
+        "model": model,
+        "temperature": route["temperature"],
+        "pool": cfg.model.pool.model_dump(),
     }
-    # Only forward optional fields if they exist from loaded config
-    if cfg.model.api_base:
-        provider_kwargs["api_base"] = cfg.model.api_base
-    if cfg.model.api_key:
-        provider_kwargs["api_key"] = cfg.model.api_key
-
-    # OVERRIDE with dynamic config if provided
-    if config:
-        if config.get("model"):
-            provider_kwargs["model"] = config["model"]
-        if config.get("api_key"):
-            provider_kwargs["api_key"] = config["api_key"]
-        
-        # If provider is explicitly passed in dynamic config, use it
-        # Note: We need the provider type to get the right provider class
-        # Ideally, config should have 'provider' key.
-        # But get_provider takes 'provider_name' as first arg.
+    if provider_name == "replay":
+        provider_kwargs.update(cfg.model.replay.model_dump())
+    # Only forward optional fields if they exist from loaded config,
+    # and never hand the configured provider's key/endpoint to another provider
+    if provider_name == cfg.model.provider:
+        if cfg.model.api_base:
+            provider_kwargs["api_base"] = cfg.model.api_base
+        if cfg.model.api_key:
+            provider_kwargs["api_key"] = cfg.model.api_key
+    if stage_api_base:
+        provider_kwargs["api_base"] = stage_api_base
+
+    # A request's key belongs to the provider it addressed (or the configured one)
+    if config and config.get("api_key") and provider_name == (requested_provider or cfg.model.provider):
+        provider_kwargs["api_key"] = config["api_key"]
     
-    provider_name = config.get("provider", cfg.model.provider) if config else cfg.model.provider
+    use_cache = cfg.model.cache and not (config and config.get("cache") is False)
 
     # 4. Get Provider & Params
     try:
         provider = get_provider(provider_name, **provider_kwargs)
-        litellm_params = provider.get_litellm_params()
-        
-        # 5. Call LiteLLM
-        # litellm.completion handles the API calls
-        response = litellm.completion(messages=messages, **litellm_params)
-        
-        return response.choices[0].message.content or ""
+    except ValueError as e:
+        raise ConfigurationError(str(e))
+    litellm_params = provider.get_litellm_params()
+    litellm_params["max_retries"] = 0  # Retries are ours (see call_with_retries), not the SDK's
+    if cfg.model.timeout:
+        litellm_params["timeout"] = cfg.model.timeout
+    budgets = (config.get("max_tokens") if config else None) or {}
+    max_tokens = cfg.model.cap_tokens(budgets[stage_name]) if stage_name in budgets else route["max_tokens"]
+    if max_tokens:
+        litellm_params["max_tokens"] = max_tokens
+    
+    # 5. Serve identical requests from the response cache
+    if use_cache:
+        cache = get_llm_cache(cfg.cache)
+        cache_key = make_cache_key(
+            messages,
+            model=litellm_params["model"],
+            provider=provider_name,
+            temperature=litellm_params.get("temperature"),
+            max_tokens=litellm_params.get("max_tokens"),
+            api_base=litellm_params.get("api_base")
+        )
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            if on_token:
+                on_token(cached)
+            return cached
+    
+    # 6. Call LiteLLM, retrying transient failures per the provider's policy
+    # litellm.acompletion handles the API calls without blocking the loop
+    streamed = []
+    
+    def forward(delta: str) -> None:
+        streamed.append(delta)
+        on_token(delta)
+    
+    async def attempt() -> Tuple[str, bool]:
+        return await _limited_completion(provider_name, cfg, messages, litellm_params, forward if on_token else None)
+    
+    async def primary() -> Tuple[str, bool]:
+        # Once tokens have reached the caller a retry would repeat them
+        return await call_with_retries(
+            attempt,
+            cfg.model.retry_policy(provider_name),
+            provider_name,
+            can_retry=lambda: not streamed
+        )
+    
+    # 7. Optionally race a secondary model when the primary is slow
+    if cfg.model.hedge.enabled and not on_token:
+        content, truncated = await _call_hedged(messages, primary, provider_name, provider_kwargs, litellm_params, cfg)
+    else:
+        content, truncated = await primary()
+    
+    # A cut-off reply is served again only if asked for again, so its truncation is reported
+    if use_cache and not truncated:
+        await cache.aset(cache_key, content)
+    return content
+
+
+async def _call_hedged(messages: list, primary, provider_name: str, provider_kwargs: dict, litellm_params: dict, cfg: PromptifyConfig) -> Tuple[str, bool]:
+    """Run primary(), racing the hedge.secondary preset against it once the hedge delay passes"""
+    hedge = cfg.model.hedge
+    preset = MODEL_PRESETS.get(hedge.secondary)
+    if preset is None:
+        raise ConfigurationError(
+            f"Unknown hedge secondary: {hedge.secondary}",
+            hint=f"Use one of the model presets: {', '.join(MODEL_PRESETS)}"
+        )
+    
+    secondary_name = preset["provider"]
+    secondary_kwargs = {
+        "model": preset["model"],
+        "temperature": provider_kwargs["temperature"],
+        "pool": provider_kwargs["pool"],
+    }
+    # A caller's key is only valid for its own provider; others use their env var
+    if secondary_name == provider_name and provider_kwargs.get("api_key"):
+        secondary_kwargs["api_key"] = provider_kwargs["api_key"]
+    secondary_params = get_provider(secondary_name, **secondary_kwargs).get_litellm_params()
+    secondary_params["max_retries"] = 0
+    if cfg.model.timeout:
+        secondary_params["timeout"] = cfg.model.timeout
+    if litellm_params.get("max_tokens"):
+        secondary_params["max_tokens"] = litellm_params["max_tokens"]
+    
+    if secondary_name == provider_name and secondary_params["model"] == litellm_params["model"]:
+        return await primary()  # Hedging against ourselves would only double the load
+    
+    async def secondary() -> Tuple[str, bool]:
+        async def attempt() -> Tuple[str, bool]:
+            return await _limited_completion(secondary_name, cfg, messages, secondary_params)
+        return await call_with_retries(attempt, cfg.model.retry_policy(secondary_name), secondary_name)
+    
+    name = f"{provider_name}/{litellm_params['model']}"
+    return await hedged_call(name, primary, secondary, hedge_delay(name, hedge))
+
+
+async def _limited_completion(provider_name: str, cfg: PromptifyConfig, messages: list, litellm_params: dict, on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, bool]:
+    """
+    One completion, after waiting for capacity in the provider's rate-limit
+    budget (if any); returns the text and whether max_tokens cut it off
+    """
+    budget = cfg.model.rate_limits.get(provider_name)
+    if budget is None:
+        content, usage = await _tracked_completion(provider_name, messages, litellm_params, on_token)
+        return content, usage["truncated"]
+    
+    limiter = get_rate_limiter(cfg.model.rate_limit_path)
+    estimate = estimate_tokens(messages, litellm_params.get("max_tokens"))
+    waited = await limiter.acquire(provider_name, budget, estimate)
+    if waited >= 1:
+        print(f"⏳ [{provider_name}] Rate limit budget: waited {waited:.1f}s for capacity")
+    
+    content, usage = await _tracked_completion(provider_name, messages, litellm_params, on_token)
+    await limiter.adjust(provider_name, budget, usage["prompt_tokens"] + usage["completion_tokens"] - estimate)
+    return content, usage["truncated"]
+
+
+async def _tracked_completion(provider_name: str, messages: list, litellm_params: dict, on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, dict]:
+    """_completion, recorded in the per-provider/model metrics and the current stage's token usage"""
+    model = litellm_params["model"]
+    with track(LLM_DURATION, LLM_ERRORS, LLM_IN_FLIGHT, provider=provider_name, model=model):
+        content, usage = await _completion(messages, litellm_params, on_token)
+    if usage["truncated"]:
+        stage_name = _current_stage.get() or "none"
+        LLM_TRUNCATED.inc(provider=provider_name, model=model, stage=stage_name)
+        print(f"✂  [{stage_name.upper()}] Output stopped at max_tokens={litellm_params.get('max_tokens')}")
+    record_usage(model, usage["prompt_tokens"], usage["completion_tokens"], usage["truncated"])
+    return content, usage
+
+
+async def _completion(messages: list, litellm_params: dict, on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, dict]:
+    """
+    Call litellm once; returns the text, its prompt/completion token counts
+    and whether it was truncated (finish_reason "length")
+    """
+    if on_token:
+        content, usage, finish_reason = await _stream_completion(messages, litellm_params, on_token)
+    else:
+        acompletion, params = _split_acompletion(litellm_params)
+        response = await acompletion(messages=messages, **params)
+        content = response.choices[0].message.content or ""
+        usage = getattr(response, "usage", None)
+        finish_reason = getattr(response.choices[0], "finish_reason", None)
+    truncated = finish_reason == "length"
+    
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        return content, {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens or 0, "truncated": truncated}
+    
+    # Provider didn't report usage: estimate. litellm.token_counter would block
+    # the event loop, and may download a tokenizer (llama-3 models)
+    return content, {
+        "prompt_tokens": approx_tokens("".join(str(m.get("content", "")) for m in messages)),
+        "completion_tokens": approx_tokens(content),
+        "truncated": truncated,
+    }
+
+
+def _split_acompletion(litellm_params: dict) -> Tuple[Callable, dict]:
+    """The provider's own acompletion (e.g. the replay provider) if it has one, else litellm's"""
+    params = dict(litellm_params)
+    return params.pop("acompletion", litellm.acompletion), params
+
+
+async def _stream_completion(messages: list, litellm_params: dict, on_token: Callable[[str], None]) -> Tuple[str, Optional[Any], Optional[str]]:
+    """Stream a completion, forwarding each delta to on_token; returns the full text, usage if sent, and finish_reason"""
+    parts = []
+    usage = None
+    finish_reason = None
+    acompletion, params = _split_acompletion(litellm_params)
+    # Ask for a final usage chunk, so token counts don't have to be estimated
+    response = await acompletion(messages=messages, stream=True, stream_options={"include_usage": True}, **params)
+    async for chunk in response:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            on_token(delta)
+        if chunk.choices and chunk.choices[0].finish_reason:
+            finish_reason = chunk.choices[0].finish_reason
+        usage = getattr(chunk, "usage", None) or usage
+    return "".join(parts), usage, finish_reason
+
+
+def _bind_llm(model_config: dict = None, cfg: PromptifyConfig = None, on_token: Optional[Callable[[str], None]] = None):
+    """Bind a model config to call_llm as an async runnable function"""
+    async def _call(prompt_value):
+        return await call_llm(prompt_value, config=model_config, cfg=cfg, on_token=on_token)
+    return _call
+
+
+def _no_writer(_event) -> None:
+    """Stream writer used when a node is called outside a streaming run"""
+
+
+def stage(name: str):
+    """
+    Wrap a node so it emits stage_started / stage_finished events
+    (the latter with the elapsed seconds and the node's state update),
+    and adds the stage's token usage and cost to state["usage"][name].
+    Provider calls inside the node use the stage's model.stages route.
+    
+    Events go to LangGraph's custom stream (graph.astream with
+    stream_mode="custom"); plain ainvoke runs simply drop them.
+    """
+    def decorate(fn):
+        async def node(state: AgentState, writer: StreamWriter = None) -> dict:
+            writer = writer or _no_writer
+            writer({"event": "stage_started", "stage": name})
+            start = time.perf_counter()
+            stage_token = _current_stage.set(name)
+            try:
+                with track(STAGE_DURATION, STAGE_ERRORS, STAGE_IN_FLIGHT, stage=name), collect_usage() as usage:
+                    update = await fn(state, writer)
+            finally:
+                _current_stage.reset(stage_token)
+            update = {**update, "usage": {name: usage}}
+            writer({
+                "event": "stage_finished",
+                "stage": name,
+                "elapsed": round(time.perf_counter() - start, 3),
+                "output": update
+            })
+            return update
         
-    except Exception as e:
-        error_msg = f"❌ [LLM Error] {str(e)}"
-        print(error_msg)
-        return error_msg  # Or raise, depending on desired robustness
+        node.__name__ = fn.__name__
+        node.__doc__ = fn.__doc__
+        return node
+    return decorate
 
 
-def create_chain(system_prompt: str, include_user_msg: bool = True, model_config: dict = None):
+def create_chain(system_prompt: str, include_user_msg: bool = True, model_config: dict = None, cfg: PromptifyConfig = None):
     """Factory function to create prompt chains using dynamic LLM"""
     messages = [("system", system_prompt)]
     if include_user_msg:
@@ -93,7 +363,7 @@ def create_chain(system_prompt: str, include_user_msg: bool = True, model_config
     # Pipe: Template -> Custom LLM Caller
     # We don't need StrOutputParser because call_llm returns a string.
     # Bind the config to the call_llm function
-    return template | RunnableLambda(lambda x: call_llm(x, config=model_config))
+    return template | RunnableLambda(_bind_llm(model_config, cfg))
 
 
 PERSONA_MAP = {
@@ -104,31 +374,55 @@ PERSONA_MAP = {
 }
 
 
-def triageAgent(state: AgentState) -> dict:
-    """Classifies user intent"""
+@stage("triage")
+async def triageAgent(state: AgentState, writer: StreamWriter) -> dict:
+    """
+    Classifies user intent
+    
+    The local rule-based classifier answers when it is confident enough
+    (triage.local_threshold); otherwise, or for a shadow sample, the LLM
+    decides and the local guess is scored against it.
+    """
     print("🔍 [TRIAGE] Analyzing...")
-    chain = create_chain(TRIAGE_AGENT_PROMPT, model_config=state.get("model_config"))
-    response = chain.invoke({"user_input": state["user_query"]})
+    cfg = state.get("config") or PromptifyConfig.load_or_default()
+    local_intent, confidence = classify_intent(state["user_query"])
+    
+    threshold = cfg.triage.local_threshold
+    confident = threshold is not None and confidence >= threshold
+    shadow = confident and random.random() < cfg.triage.shadow_rate
+    if confident and not shadow:
+        record_triage("local", local_intent)
+        print(f"✅ [TRIAGE] {local_intent} (local, confidence {confidence:.2f})")
+        return {"intent": local_intent}
+    
+    chain = create_chain(TRIAGE_AGENT_PROMPT, model_config=state.get("model_config"), cfg=cfg)
+    response = await chain.ainvoke({"user_input": state["user_query"]})
     
     intent = response.strip().upper()
     valid_intents = list(PERSONA_MAP.keys())
     result = intent if intent in valid_intents else "ARCHITECT"
     
+    record_triage("llm", local_intent, result, shadow)
+    if cfg.triage.log_path:
+        log_triage(cfg.triage.log_path, state["user_query"], result, local_intent, confidence)
+    
     print(f"✅ [TRIAGE] {result}")
     return {"intent": result}
 
 
-def criticAgent(state: AgentState) -> dict:
+@stage("critic")
+async def criticAgent(state: AgentState, writer: StreamWriter) -> dict:
     """Identifies gaps in the user query"""
     print("🔍 [CRITIC] Analyzing...")
-    chain = create_chain(CRITIQUE_AGENT_PROMPT, model_config=state.get("model_config"))
-    response = chain.invoke({"user_input": state["user_query"]})
+    chain = create_chain(CRITIQUE_AGENT_PROMPT, model_config=state.get("model_config"), cfg=state.get("config"))
+    response = await chain.ainvoke({"user_input": state["user_query"]})
     
     print("✅ [CRITIC] Done")
     return {"critique": response.strip()}
 
 
-def expertAgent(state: AgentState) -> dict:
+@stage("expert")
+async def expertAgent(state: AgentState, writer: StreamWriter) -> dict:
     """Provides domain-specific expert advice"""
     print(f"🔍 [EXPERT] Consulting {state['intent']} expert...")
     
@@ -145,9 +439,9 @@ def expertAgent(state: AgentState) -> dict:
 Provide your expert suggestions now.""")
     ])
     
-    chain = template | RunnableLambda(lambda x: call_llm(x, config=state.get("model_config")))
+    chain = template | RunnableLambda(_bind_llm(state.get("model_config"), state.get("config")))
     
-    response = chain.invoke({
+    response = await chain.ainvoke({
         "persona": selected_persona,
         "intent": state["intent"],
         "user_query": state["user_query"],
@@ -158,7 +452,49 @@ Provide your expert suggestions now.""")
     return {"expert_suggestions": response.strip()}
 
 
-def promptSmith(state: AgentState) -> dict:
+def parse_analysis(response: str) -> dict:
+    """
+    Intent, critique and expert suggestions from the fast analysis reply.
+    
+    Tolerates code fences and chatter around the JSON object; if no object
+    can be read, the whole reply is kept as the expert suggestions.
+    """
+    text = response.strip()
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        data = json.loads(text[start:end + 1]) if start != -1 and end > start else None
+    except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        return {"intent": "ARCHITECT", "critique": "", "expert_suggestions": text}
+    
+    def as_text(value) -> str:
+        if isinstance(value, list):
+            return "\n".join(f"- {item}" for item in value)
+        return str(value or "").strip()
+    
+    intent = str(data.get("intent", "")).strip().upper()
+    return {
+        "intent": intent if intent in PERSONA_MAP else "ARCHITECT",
+        "critique": as_text(data.get("critique")),
+        "expert_suggestions": as_text(data.get("expert_suggestions")),
+    }
+
+
+@stage("analyze")
+async def fastAnalyzer(state: AgentState, writer: StreamWriter) -> dict:
+    """Triage, critique and expert advice in one structured call (fast mode)"""
+    print("🔍 [ANALYZE] Triage, critique and expert advice in one pass...")
+    chain = create_chain(FAST_ANALYSIS_PROMPT, model_config=state.get("model_config"), cfg=state.get("config"))
+    response = await chain.ainvoke({"user_input": state["user_query"]})
+    
+    analysis = parse_analysis(response)
+    print(f"✅ [ANALYZE] {analysis['intent']}")
+    return analysis
+
+
+@stage("smith")
+async def promptSmith(state: AgentState, writer: StreamWriter) -> dict:
     """Synthesizes the final structured prompt"""
     print("🔍 [SMITH] Crafting final prompt...")
     
@@ -173,9 +509,15 @@ def promptSmith(state: AgentState) -> dict:
 Create the final refined prompt now.""")
     ])
     
-    chain = template | RunnableLambda(lambda x: call_llm(x, config=state.get("model_config")))
+    # Stream the final prompt token by token when the caller is streaming
+    model_config = state.get("model_config") or {}
+    on_token = None
+    if model_config.get("stream"):
+        on_token = lambda text: writer({"event": "token", "stage": "smith", "text": text})
+    
+    chain = template | RunnableLambda(_bind_llm(state.get("model_config"), state.get("config"), on_token))
     
-    response = chain.invoke({
+    response = await chain.ainvoke({
         "user_query": state["user_query"],
         "expert_suggestions": state["expert_suggestions"],
         "critique": state["critique"]
@@ -1,4 +1,6 @@
-from typing import TypedDict, Optional
+import operator
+from typing import Annotated, Dict, TypedDict, Optional
+from promptify.core.providerSelection.config import PromptifyConfig
 class AgentState(TypedDict):
     user_query: str
     intent: str                 # Populated by Triage (e.g., "coding", "writing")
@@ -7,5 +9,5 @@ class AgentState(TypedDict):
     final_prompt_draft: str     # Populated by Prompt Smith
     iteration_count: int        # To prevent infinite loops if we add a retry cycle later
     model_config: Optional[dict] # Configuration for the model to use
-
-
+    config: Optional[PromptifyConfig] # Resolved once per refine and shared by every node
+    usage: Annotated[Dict[str, dict], operator.or_] # Token usage and cost per stage (merged as stages finish)
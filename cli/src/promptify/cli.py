@@ -5,24 +5,29 @@ Thin CLI layer - delegates to core modules
 
 import typer
 from rich.console import Console
+from rich.live import Live
+from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from importlib.metadata import version as package_version, PackageNotFoundError
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
+import asyncio
+import contextlib
+import json
 import os
+import sys
+import time
 
 # Import core modules
+# Heavy dependencies (langgraph/litellm via the agent graph, promptmasker,
+# textual) are imported inside the commands that need them, so commands
+# like `version` and `commands` start instantly.
 from promptify.core.validator import InputValidator
-from promptify.core.service import PromptifyService
-from promptify.core.formatter import RichFormatter, JSONFormatter
-from promptify.utils.errors import PromptifyError, ValidationError, ServiceError, ConfigurationError
-from promptify.agent.graph import promptify
-
-#Import PromptMasker
-from promptmasker import PromptMasker
+from promptify.core.formatter import RichFormatter, JSONFormatter, format_usage
+from promptify.core.usage import empty_usage, add_usage
+from promptify.utils.errors import PromptifyError, ValidationError, ServiceError, ConfigurationError, APIError
 
 # Import CLI Helpers
-from promptify.cli_supports.PromptifyTUI import PromptifyTUI
 from promptify.cli_supports.help_content import HELP_CONTENT
 app = typer.Typer(
     name="promptify",
@@ -33,15 +38,34 @@ console = Console()
 
 # Dependency injection
 validator = InputValidator()
-service = PromptifyService(graph=promptify)
-
-masker = PromptMasker()
 
 formatters = {
     "rich": RichFormatter(),
     "json": JSONFormatter()
 }
 
+_service = None
+_masker = None
+
+
+def get_service():
+    """PromptifyService over the compiled agent graph, built on first use"""
+    global _service
+    if _service is None:
+        from promptify.core.service import PromptifyService
+        from promptify.agent.graph import get_promptify_graph, get_fast_graph
+        _service = PromptifyService(graph=get_promptify_graph(), fast_graph=get_fast_graph())
+    return _service
+
+
+def get_masker():
+    """PromptMasker, built on first use"""
+    global _masker
+    if _masker is None:
+        from promptmasker import PromptMasker
+        _masker = PromptMasker()
+    return _masker
+
 
 def show_banner():
     """Display banner"""
@@ -57,13 +81,96 @@ def show_banner():
     console.print("[dim]Transform vague prompts → Professional specs[/dim]\n")
 
 
+def validate_provider_key():
+    """Load config and check the configured provider's API key is set"""
+    from promptify.core.providerSelection.config import PromptifyConfig
+    cfg = PromptifyConfig.load()
+    provider = cfg.model.provider
+    
+    # Check specific env vars based on provider
+    if provider == "cerebras":
+        validator.validate_api_key(os.getenv("CEREBRAS_API_KEY"))
+    elif provider == "gemini":
+        validator.validate_api_key(os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"))
+    elif provider == "openai":
+        validator.validate_api_key(os.getenv("OPENAI_API_KEY"))
+    elif provider == "anthropic":
+        validator.validate_api_key(os.getenv("ANTHROPIC_API_KEY"))
+    # local might not need api key or uses a different one
+
+
+def mask_query(query: str) -> str:
+    """Mask sensitive data in a query before it leaves the machine"""
+    masked_output = get_masker().mask(query)
+    if isinstance(masked_output, dict):
+        return masked_output.get("masked_text", query)
+    return str(masked_output)
+
+
+def parse_budgets(values: Optional[List[str]]) -> Dict[str, Optional[int]]:
+    """--max-tokens STAGE=N options as {stage: N} (N=0: no limit)"""
+    budgets = {}
+    for value in values or []:
+        stage, _, limit = value.partition("=")
+        if not limit.strip().isdigit():
+            raise ValidationError(
+                f"Invalid --max-tokens value: {value}",
+                hint="Use STAGE=N, e.g. --max-tokens smith=4096 (0 = no limit)"
+            )
+        budgets[stage.strip().lower()] = int(limit)
+    return budgets
+
+
+def stream_refine(query: str, use_cache: bool = True, mode: str = "full", max_tokens: Dict[str, Optional[int]] = None) -> dict:
+    """
+    Refine a query showing each stage as it completes (with elapsed time)
+    and the final prompt streaming into a live panel as it is written.
+    """
+    # Bind to the real stdout before agent status prints are silenced below
+    live_console = Console(file=sys.stdout)
+    
+    async def run() -> dict:
+        tokens = []
+        result = None
+        
+        def render() -> Panel:
+            return Panel(
+                "".join(tokens) or "[dim]Waiting for the agents...[/dim]",
+                title="* Refining",
+                border_style="magenta"
+            )
+        
+        from promptify.core.providerSelection.providers import aclose_all
+        try:
+            with Live(render(), console=live_console, transient=True, refresh_per_second=15) as live:
+                async for event in get_service().astream(query, use_cache=use_cache, mode=mode, max_tokens=max_tokens):
+                    if event["event"] == "stage_finished":
+                        live.console.print(
+                            f"[green]✔[/green] {event['stage'].upper():<7} [dim]{event['elapsed']:.1f}s[/dim]"
+                        )
+                    elif event["event"] == "token":
+                        tokens.append(event["text"])
+                        live.update(render())
+                    elif event["event"] == "result":
+                        result = event["result"]
+        finally:
+            await aclose_all()
+        return result
+    
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return asyncio.run(run())
+
+
 @app.command()
 def refine(
     query: Optional[str] = typer.Argument(None, help="Query to refine"),
     file: Optional[Path] = typer.Option(None, "--file", "-f", help="Read from file", exists=True),
     output: Optional[Path] = typer.Option(None, "--output", "-o", help="Save to file"),
     format: str = typer.Option("tui", "--format", help="Output format: tui|rich|json"),
-    verbose: bool = typer.Option(False, "--verbose", "-v", help="Show detailed analysis")
+    verbose: bool = typer.Option(False, "--verbose", "-v", help="Show detailed analysis"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the provider, ignoring cached responses"),
+    mode: str = typer.Option("full", "--mode", help="full: four agents | fast: one analysis call, then the Smith"),
+    max_tokens: Optional[List[str]] = typer.Option(None, "--max-tokens", help="Output-token budget for a stage, as STAGE=N (repeatable; 0 = no limit)")
 ):
     """
     Refine a prompt using AI agents
@@ -74,27 +181,18 @@ def refine(
         promptify refine "design database" --verbose
         promptify refine "build api" --format rich
         promptify refine "build api" --format json --output result.json
+        promptify refine "build api" --no-cache
+        promptify refine "build api" --mode fast
+        promptify refine "build api" --max-tokens smith=4096
     """
     
     show_banner()
     
     try:
-        # 1. Load config and validate API key dynamically
-        from promptify.core.providerSelection.config import PromptifyConfig
-        cfg = PromptifyConfig.load()
-        provider = cfg.model.provider
+        budgets = parse_budgets(max_tokens)
         
-        # Check specific env vars based on provider
-        if provider == "cerebras":
-            validator.validate_api_key(os.getenv("CEREBRAS_API_KEY"))
-        elif provider == "gemini":
-            validator.validate_api_key(os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"))
-        elif provider == "openai":
-            validator.validate_api_key(os.getenv("OPENAI_API_KEY"))
-        elif provider == "anthropic":
-            validator.validate_api_key(os.getenv("ANTHROPIC_API_KEY"))
-        # local might not need api key or uses a different one
-
+        # 1. Load config and validate API key dynamically
+        validate_provider_key()
         
         # 2. Get and validate input
         if file:
@@ -104,36 +202,40 @@ def refine(
             query = validator.validate_query(query)
         
         # 2.1 Mask sensitive data in query
-        masked_output = masker.mask(query)
-        if isinstance(masked_output, dict):
-            masked_query = masked_output.get("masked_text", query)
-            mask_map = masked_output.get("mask_map", {})
-        else:
-            masked_query = str(masked_output)
-            mask_map = {}
+        masked_query = mask_query(query)
         
         # Show input
         console.print(f"[cyan] Query:[/cyan] {masked_query[:100]}{'...' if len(masked_query) > 100 else ''}\n")
         
-        # 3. Process with progress spinner
-        with Progress(
-            console=console,
-        ) as progress:
-            task = progress.add_task("[Processing] AI Agents working...", total=None)
-            result = service.refine(masked_query)
-            progress.remove_task(task)
+        # 3. Process: stream into the TUI or a live panel; JSON waits for the result
+        if format == "tui":
+            # Interactive TUI (default), filled token by token
+            from promptify.cli_supports.PromptifyTUI import PromptifyTUI
+            tui = PromptifyTUI(stream=get_service().astream(masked_query, use_cache=not no_cache, mode=mode, max_tokens=budgets))
+            tui.run()
+            if tui.error is not None:
+                raise tui.error
+            if tui.result is None:
+                console.print("\n[yellow]!  Closed before the refinement finished[/yellow]")
+                raise typer.Exit(0)
+            result = tui.result
+        elif format == "json":
+            with Progress(
+                console=console,
+            ) as progress:
+                task = progress.add_task("[Processing] AI Agents working...", total=None)
+                result = get_service().refine(masked_query, use_cache=not no_cache, mode=mode, max_tokens=budgets)
+                progress.remove_task(task)
+        else:
+            result = stream_refine(masked_query, use_cache=not no_cache, mode=mode, max_tokens=budgets)
         
         console.print()
         console.print("[green]✔ Processing complete![/green]\n")
         
         result_text = result['final_prompt_draft']
         
-        # 4. Display based on format
-        if format == "tui":
-            # Interactive TUI (default)
-            tui = PromptifyTUI(result_text)
-            tui.run()
-        else:
+        # 4. Display based on format (the TUI has already shown it)
+        if format != "tui":
             # Traditional CLI output (rich or json)
             formatter = formatters.get(format, formatters["rich"])
             output_text = formatter.format_result(result, verbose)
@@ -161,6 +263,10 @@ def refine(
         console.print(f"[red]✖ Service Error:[/red]\n{e}")
         raise typer.Exit(1)
     
+    except APIError as e:
+        console.print(f"[red]✖ API Error:[/red]\n{e}")
+        raise typer.Exit(1)
+    
     except PromptifyError as e:
         console.print(f"[red]✖ Error:[/red]\n{e}")
         raise typer.Exit(1)
@@ -175,6 +281,150 @@ def refine(
             console.print_exception()
         raise typer.Exit(1)
 
+def read_batch_records(input_path: Path, skip_ids: set, errors: list):
+    """
+    Lazily yield (id, masked query) pairs from a JSONL file.
+    
+    Accepts records like requests.jsonl ({"request_id", "title", "body"})
+    or plain {"id", "prompt"}. Unusable lines are appended to `errors`.
+    """
+    with open(input_path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item_id = f"line-{line_no}"
+            try:
+                record = json.loads(line)
+                item_id = str(record.get("request_id") or record.get("id") or item_id)
+                if item_id in skip_ids:
+                    continue
+                query = record.get("prompt") or record.get("query") or record.get("body") or ""
+                if record.get("title") and record.get("body"):
+                    query = f"{record['title']}\n\n{record['body']}"
+                yield item_id, mask_query(validator.validate_query(query))
+            except (json.JSONDecodeError, AttributeError):
+                if item_id not in skip_ids:
+                    errors.append({"id": item_id, "error": "Invalid JSON record"})
+            except ValidationError as e:
+                errors.append({"id": item_id, "error": e.message})
+
+
+def read_done_ids(output_path: Path) -> set:
+    """
+    Ids already present in an NDJSON output file (for --resume).
+    Records that failed with a provider error are retried, not skipped.
+    """
+    done = set()
+    if not output_path.exists():
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written last line from an interrupted run
+            if isinstance(record, dict) and "id" in record and "refined_prompt" in record:
+                done.add(str(record["id"]))
+    return done
+
+
+@app.command()
+def batch(
+    input: Path = typer.Argument(..., help="JSONL file of prompts", exists=True, dir_okay=False),
+    output: Path = typer.Option(..., "--output", "-o", help="NDJSON file to write results to"),
+    concurrency: int = typer.Option(8, "--concurrency", "-c", min=1, help="Refinements in flight at once"),
+    resume: bool = typer.Option(False, "--resume", help="Skip ids already refined in the output file"),
+    verbose: bool = typer.Option(False, "--verbose", "-v", help="Include critique and expert suggestions"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the provider, ignoring cached responses")
+):
+    """
+    Refine every prompt in a JSONL file
+    
+    Each result is appended to the output as one NDJSON line as soon as it
+    finishes, so memory stays flat for very large inputs.
+    
+    Examples:
+        promptify batch prompts.jsonl -o refined.jsonl
+        promptify batch prompts.jsonl -o refined.jsonl --concurrency 16 --resume
+    """
+    err_console = Console(stderr=True)
+    
+    try:
+        validate_provider_key()
+    except ConfigurationError as e:
+        err_console.print(f"[red]✖ Configuration Error:[/red]\n{e}")
+        raise typer.Exit(1)
+    
+    skip_ids = read_done_ids(output) if resume else set()
+    if skip_ids:
+        err_console.print(f"[dim]Resuming: skipping {len(skip_ids)} finished ids[/dim]")
+    
+    output.parent.mkdir(parents=True, exist_ok=True)
+    formatter = JSONFormatter()
+    invalid = []
+    counts = {"ok": 0, "cached": 0, "error": 0}
+    usage = empty_usage()
+    
+    def write(out, record: dict):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+    
+    async def run(out, progress, task):
+        from promptify.core.providerSelection.providers import aclose_all
+        items = read_batch_records(input, skip_ids, invalid)
+        try:
+            async for item in get_service().arefine_many(items, concurrency=concurrency, use_cache=not no_cache):
+                if "error" in item:
+                    counts["error"] += 1
+                    write(out, item)
+                else:
+                    counts["ok"] += 1
+                    counts["cached"] += bool(item["result"].get("cached"))
+                    add_usage(usage, item["result"].get("total_usage"))
+                    write(out, {"id": item["id"], **formatter.to_dict(item["result"], verbose)})
+                while invalid:
+                    counts["error"] += 1
+                    write(out, invalid.pop())
+                progress.advance(task)
+        finally:
+            await aclose_all()
+        
+        while invalid:
+            counts["error"] += 1
+            write(out, invalid.pop())
+    
+    start = time.perf_counter()
+    with open(output, "a" if resume else "w", encoding="utf-8") as out, \
+            open(os.devnull, "w") as devnull, \
+            Progress(console=err_console) as progress, \
+            contextlib.redirect_stdout(devnull):
+        # Agent status lines would interleave; the progress bar replaces them
+        task = progress.add_task("[Processing] Refining batch...", total=None)
+        try:
+            asyncio.run(run(out, progress, task))
+        except KeyboardInterrupt:
+            err_console.print("\n[yellow]!  Interrupted — rerun with --resume to continue[/yellow]")
+    
+    elapsed = time.perf_counter() - start
+    err_console.print(
+        f"[green]✔ {counts['ok']} refined[/green] ({counts['cached']} from cache), "
+        f"[red]{counts['error']} failed[/red] in {elapsed:.1f}s → [green]{output}[/green]"
+    )
+    err_console.print(f"[dim]{format_usage(usage)}[/dim]")
+    
+    from promptify.core.intent import get_triage_stats
+    triage = get_triage_stats()
+    if triage["local"] + triage["llm"]:
+        agreement = triage["agreement_rate"]
+        err_console.print(
+            f"[dim]Triage: {triage['skip_rate']:.0%} decided locally"
+            + (f", local guess matched the LLM on {agreement:.0%} of the rest" if agreement is not None else "")
+            + "[/dim]"
+        )
+    if counts["error"]:
+        raise typer.Exit(1)
+
+
 def get_version():
     try:
         return package_version("pfy")
@@ -191,7 +441,7 @@ def version():
     show_banner()
     console.print("[bold]Version:[/bold] " + get_version())
     console.print("[bold]Framework:[/bold] LangGraph + Python")
-    console.print("[bold]Agents:[/bold] Triage → Critic → Expert → Smith")
+    console.print("[bold]Agents:[/bold] (Triage ∥ Critic) → Expert → Smith")
 
 @app.command()
 def commands():
@@ -222,12 +472,26 @@ def commands():
             for example in cmd.examples:
                 console.print(f"  {example}")
 
+def describe_stage(cfg, stage: str) -> str:
+    """One-line summary of the route a stage resolves to"""
+    route = cfg.model.stage_route(stage)
+    text = f"{route['provider']} / {route['model']} (temp {route['temperature']}"
+    if route["max_tokens"]:
+        text += f", max {route['max_tokens']} tokens"
+    preset = cfg.model.stages[stage].preset
+    return text + (f", preset {preset})" if preset else ")")
+
 @app.command()
 def config(
     provider: Optional[str] = typer.Option(None, "--provider", "-p", help="Set LLM provider (cerebras, openai, anthropic, local)"),
     model: Optional[str] = typer.Option(None, "--model", "-m", help="Set model name"),
     temperature: Optional[float] = typer.Option(None, "--temp", "-t", help="Set temperature (0.0 - 1.0)"),
+    stage: Optional[str] = typer.Option(None, "--stage", "-s", help="Apply --provider/--model/--temp/--preset/--max-tokens to one stage (triage, critic, expert, smith, analyze)"),
+    preset: Optional[str] = typer.Option(None, "--preset", help="Model preset for --stage (e.g. cerebras-8b, gpt-4o, claude)"),
+    max_tokens: Optional[int] = typer.Option(None, "--max-tokens", help="Cap output tokens for every stage, or set one stage's budget with --stage (0 = no cap)"),
+    reset_stage: Optional[str] = typer.Option(None, "--reset-stage", help="Remove a stage's override (or 'all')"),
     verbose: Optional[bool] = typer.Option(None, "--verbose/--no-verbose", help="Enable/disable verbose mode"),
+    cache: Optional[bool] = typer.Option(None, "--cache/--no-cache", help="Enable/disable the LLM response cache"),
     show: bool = typer.Option(False, "--show", help="Show current configuration")
 ):
     """
@@ -237,16 +501,28 @@ def config(
         promptify config            # Launch Interactive UI
         promptify config --show
         promptify config --provider openai --model gpt-4
+        promptify config --stage triage --preset cerebras-8b
+        promptify config --stage smith --provider openai --model gpt-4o
     """
     
     # If no arguments provided, run Interactive TUI
-    if not any([provider, model, temperature, verbose is not None, show]):
+    if not any([provider, model, temperature is not None, stage, preset, max_tokens is not None, reset_stage,
+                verbose is not None, cache is not None, show]):
         from promptify.cli_supports.ConfigTUI import ConfigTUI
         app = ConfigTUI()
         app.run()
         return
 
-    from promptify.core.providerSelection.config import PromptifyConfig
+    from pydantic import ValidationError as PydanticValidationError
+    from promptify.core.providerSelection.config import PromptifyConfig, StageModelConfig, STAGES
+    
+    for name in (stage, reset_stage):
+        if name and name not in STAGES and not (name == reset_stage == "all"):
+            console.print(f"[red]✖ Unknown stage: {name}[/red] (use one of: {', '.join(STAGES)})")
+            raise typer.Exit(1)
+    if preset and not stage:
+        console.print("[red]✖ --preset needs --stage[/red] (e.g. --stage smith --preset gpt-4o)")
+        raise typer.Exit(1)
     
     # Load existing config
     cfg = PromptifyConfig.load()
@@ -254,6 +530,29 @@ def config(
     # Update if arguments are provided
     updated = False
     
+    if reset_stage:
+        names = list(cfg.model.stages) if reset_stage == "all" else [reset_stage]
+        for name in names:
+            cfg.model.stages.pop(name, None)
+        updated = True
+        console.print(f"[green]Reset stage override: {reset_stage}[/green]")
+    
+    if stage and any([provider, model, temperature is not None, preset, max_tokens is not None]):
+        current = cfg.model.stages.get(stage, StageModelConfig()).model_dump()
+        changes = {"preset": preset, "provider": provider, "model": model, "temperature": temperature, "max_tokens": max_tokens}
+        if preset:
+            # A preset replaces the stage's provider/model unless they are given too
+            current.update(provider=None, model=None)
+        current.update({field: value for field, value in changes.items() if value is not None})
+        try:
+            cfg.model.stages[stage] = StageModelConfig(**current)
+        except PydanticValidationError as e:
+            console.print(f"[red]✖ Invalid stage override:[/red] {e.errors()[0]['msg']}")
+            raise typer.Exit(1)
+        updated = True
+        console.print(f"[green]Set {stage} stage: {describe_stage(cfg, stage)}[/green]")
+        provider = model = temperature = max_tokens = None
+    
     if provider:
         cfg.model.provider = provider
         updated = True
@@ -268,6 +567,11 @@ def config(
         cfg.model.temperature = temperature
         updated = True
         console.print(f"[green]Set temperature to: {temperature}[/green]")
+    
+    if max_tokens is not None:
+        cfg.model.max_tokens = max_tokens or None
+        updated = True
+        console.print(f"[green]Set max tokens cap to: {max_tokens or 'none'}[/green]")
         
     if verbose is not None:
         cfg.verbose = verbose
@@ -275,6 +579,12 @@ def config(
         status = "enabled" if verbose else "disabled"
         console.print(f"[green]Verbose mode {status}[/green]")
     
+    if cache is not None:
+        cfg.model.cache = cache
+        updated = True
+        status = "enabled" if cache else "disabled"
+        console.print(f"[green]Response cache {status}[/green]")
+    
     # Save if changed
     if updated:
         cfg.save()
@@ -287,7 +597,15 @@ def config(
         console.print(f"  Model:       [cyan]{cfg.model.model}[/cyan]")
         console.print(f"  Temperature: [cyan]{cfg.model.temperature}[/cyan]")
         console.print(f"  Verbose:     [cyan]{cfg.verbose}[/cyan]")
+        console.print(f"  Cache:       [cyan]{cfg.model.cache}[/cyan]")
         console.print(f"  API Key:     [dim]{'Set in .env' if cfg.model.api_key or os.getenv('CEREBRAS_API_KEY') or os.getenv('OPENAI_API_KEY') else 'Missing'}[/dim]")
+        budgets = ", ".join(f"{name} {cfg.model.stage_route(name)['max_tokens'] or '-'}" for name in STAGES)
+        console.print(f"  Max tokens:  [cyan]{budgets}[/cyan]")
+        if cfg.model.stages:
+            console.print("  Stages:")
+            for name in STAGES:
+                if name in cfg.model.stages:
+                    console.print(f"    {name:<8} [cyan]{describe_stage(cfg, name)}[/cyan]")
 
 
 if __name__ == "__main__":
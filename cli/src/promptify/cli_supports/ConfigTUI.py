@@ -9,7 +9,10 @@ from textual.containers import Vertical, Horizontal, Grid
 from textual.widgets import Header, Footer, Button, Static, Input, Select, Label
 from textual.screen import Screen
 
-from promptify.core.providerSelection.config import PromptifyConfig, MODEL_PRESETS
+from promptify.core.providerSelection.config import PromptifyConfig, StageModelConfig, MODEL_PRESETS
+
+# Stages offered in the TUI (the fast-mode "analyze" stage is set in config.yml)
+TUI_STAGES = ("triage", "critic", "expert", "smith")
 
 class ConfigTUI(App):
     """Interactive Configuration TUI"""
@@ -58,7 +61,7 @@ class ConfigTUI(App):
         with Vertical(classes="box"):
             yield Label("Select Provider:")
             yield Select(
-                [(p, p) for p in ["cerebras", "openai", "anthropic", "gemini", "local"]],
+                [(p, p) for p in ["cerebras", "openai", "anthropic", "gemini", "local", "replay"]],
                 value=self.config.model.provider,
                 id="provider-select"
             )
@@ -80,6 +83,17 @@ class ConfigTUI(App):
             
             yield Label("API Key:")
             yield Label("[dim]Please set the appropriate environment variable (e.g. CEREBRAS_API_KEY, GEMINI_API_KEY) in your shell or .env file manually.[/dim]")
+        
+        with Vertical(classes="box"):
+            yield Label("Per-stage models (e.g. a small model for Triage, a strong one for the Smith):")
+            for stage in TUI_STAGES:
+                yield Label(f"{stage.capitalize()}:")
+                yield Select(
+                    self._stage_options(stage),
+                    value=self._stage_value(stage),
+                    allow_blank=False,
+                    id=f"stage-{stage}"
+                )
             
         with Horizontal(id="btn-bar"):
             yield Button("✔ Save & Exit", variant="success", id="save-btn")
@@ -87,6 +101,18 @@ class ConfigTUI(App):
             
         yield Footer()
 
+    def _stage_options(self, stage: str) -> list:
+        options = [("(same as default)", "")]
+        if self._stage_value(stage) == "custom":
+            options.append(("(custom, from config.yml)", "custom"))
+        return options + [(name, name) for name in MODEL_PRESETS]
+    
+    def _stage_value(self, stage: str) -> str:
+        override = self.config.model.stages.get(stage)
+        if override is None:
+            return ""
+        return override.preset or "custom"
+    
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "save-btn":
             self.save_config()
@@ -103,6 +129,14 @@ class ConfigTUI(App):
             self.config.model.provider = provider
             self.config.model.model = model
             self.config.model.temperature = float(temp_str)
+            for stage in TUI_STAGES:
+                preset = self.query_one(f"#stage-{stage}", Select).value
+                if preset == self._stage_value(stage):
+                    continue  # Unchanged; keeps any extra fields set in config.yml
+                if preset:
+                    self.config.model.stages[stage] = StageModelConfig(preset=preset)
+                else:
+                    self.config.model.stages.pop(stage, None)
             self.config.save()
             
             self.exit(result="Saved")
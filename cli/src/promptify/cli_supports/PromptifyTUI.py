@@ -1,6 +1,8 @@
 """
 Promptify CLI v1.0 with Interactive TUI and Inline Editing
 """
+from typing import AsyncIterator, Optional
+
 import pyperclip
 
 from textual.app import App, ComposeResult
@@ -60,12 +62,52 @@ class PromptifyTUI(App):
         Binding("ctrl+s", "save", "Save", show=False),
     ]
     
-    def __init__(self, result_text: str):
+    def __init__(self, result_text: str = "", stream: Optional[AsyncIterator[dict]] = None):
+        """
+        Show `result_text`, or pass `stream` (PromptifyService.astream events)
+        to fill the text area token by token as the Smith writes it.
+        """
         super().__init__()
         self.original_text = result_text
         self.result_text = result_text
         self.is_editing = False
         self.is_modified = False
+        self.stream = stream
+        self.result: Optional[dict] = None
+        self.error: Optional[Exception] = None
+    
+    def on_mount(self) -> None:
+        if self.stream is not None:
+            self.query_one("#title", Static).update(" PROMPTIFYING... [Streaming]")
+            self.query_one("#edit-btn", Button).disabled = True
+            self.run_worker(self._consume_stream(), exclusive=True)
+    
+    async def _consume_stream(self) -> None:
+        """Apply streamed refinement events to the UI as they arrive"""
+        text_area = self.query_one("#result-text", TextArea)
+        try:
+            async for event in self.stream:
+                if event["event"] == "stage_finished":
+                    self.sub_title = f"{event['stage'].upper()} done in {event['elapsed']:.1f}s"
+                elif event["event"] == "stage_started":
+                    self.sub_title = f"{event['stage'].upper()} working..."
+                elif event["event"] == "token":
+                    text_area.insert(event["text"], text_area.document.end)
+                elif event["event"] == "result":
+                    self.result = event["result"]
+        except Exception as e:
+            self.error = e
+            self.notify(f"✖ Refinement failed: {e}", severity="error")
+            self.query_one("#title", Static).update(" FAILED")
+            return
+        
+        self.result_text = self.original_text = self.result["final_prompt_draft"]
+        text_area.text = self.result_text
+        self.sub_title = "cached" if self.result.get("cached") else "done"
+        if self.result.get("truncated"):
+            self.notify(f"Output cut at the max_tokens budget in: {', '.join(self.result['truncated'])}", severity="warning")
+        self.query_one("#title", Static).update(" PROMPTIFIED [Read-Only]")
+        self.query_one("#edit-btn", Button).disabled = False
     
     def compose(self) -> ComposeResult:
         yield Header()
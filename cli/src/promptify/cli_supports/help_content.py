@@ -20,11 +20,19 @@ HELP_CONTENT = CLIHelpContent(
             "promptify refine --file input.txt",
             "promptify refine 'design database' --verbose",
             "promptify refine 'build api' --format rich",
-            "promptify refine 'build api' --format json --output result.json"
+            "promptify refine 'build api' --format json --output result.json",
+            "promptify refine 'build api' --no-cache"
+        ]),
+        CommandInfo("batch", "Refine every prompt in a JSONL file", [
+            "promptify batch prompts.jsonl -o refined.jsonl",
+            "promptify batch prompts.jsonl -o refined.jsonl --concurrency 16 --resume"
         ]),
         CommandInfo("config", "Configure Promptify settings", [
             "promptify config --provider openai --model gpt-4",
-            "promptify config --show"
+            "promptify config --show",
+            "promptify config --no-cache",
+            "promptify config --stage triage --preset cerebras-8b",
+            "promptify config --stage smith --provider openai --model gpt-4o"
         ]),
         CommandInfo("version", "Show version information"),
         CommandInfo("commands", "Show available commands"),
@@ -0,0 +1,242 @@
+"""
+Content-addressed caches for LLM responses and refine results
+In-memory LRU tier with an optional on-disk SQLite tier
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_CACHE_DIR = Path.home() / ".promptify" / "cache"
+
+_MISS = object()  # Lookup sentinel (None is a valid cached value)
+
+
+def _normalize(text: str) -> str:
+    """Collapse whitespace so cosmetic differences don't miss the cache"""
+    return " ".join(str(text).split())
+
+
+def make_cache_key(messages: List[Dict[str, str]], model: str, provider: str, temperature: float, max_tokens: Optional[int] = None, api_base: Optional[str] = None) -> str:
+    """Hash of the normalized message list plus model, provider, temperature, and max_tokens and api_base (if set)"""
+    payload = {
+        "messages": [{"role": m["role"], "content": _normalize(m["content"])} for m in messages],
+        "model": model,
+        "provider": provider,
+        "temperature": temperature,
+    }
+    if max_tokens:
+        payload["max_tokens"] = max_tokens  # Only when set, so existing keys stay valid
+    if api_base:
+        payload["api_base"] = api_base  # Same model name on another endpoint is another model
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier key/value cache with LRU eviction and a TTL.
+
+    The memory tier is always on; the SQLite tier is used when `disk_path`
+    is given and survives across processes. Async code should use aget/aset,
+    which keep SQLite I/O off the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: Optional[float] = 86400,
+        disk_path: Optional[Path] = None,
+        disk_max_entries: int = 100_000
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()     # Memory tier and counters (never held during I/O)
+        self._db_lock = threading.Lock()  # The SQLite connection
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes_since_prune = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_path is not None:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_created ON responses(created_at)")
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on a miss"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is _MISS and self._db is not None:
+            value = self._get_disk(key, now)
+        return self._count_miss(value)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get() for async callers: memory hits are served inline, the disk tier from a worker thread"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is _MISS and self._db is not None:
+            value = await asyncio.to_thread(self._get_disk, key, now)
+        return self._count_miss(value)
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value in every enabled tier"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+        if self._db is not None:
+            self._set_disk(key, json.dumps(value), now)
+
+    async def aset(self, key: str, value: Any) -> None:
+        """set() for async callers: the disk write runs in a worker thread"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, json.dumps(value), now)
+
+    def _get_memory(self, key: str, now: float) -> Any:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return _MISS
+            created_at, value = entry
+            if self._expired(created_at, now):
+                del self._memory[key]
+                return _MISS
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _get_disk(self, key: str, now: float) -> Any:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or self._expired(row[1], now):
+            return _MISS
+        value = json.loads(row[0])
+        with self._lock:
+            self._remember(key, value, row[1])
+            self.disk_hits += 1
+        return value
+
+    def _count_miss(self, value: Any) -> Optional[Any]:
+        if value is not _MISS:
+            return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _set_disk(self, key: str, blob: str, now: float) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)",
+                (key, blob, now)
+            )
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= 100:
+                self._prune_disk(now)
+
+    def _remember(self, key: str, value: Any, created_at: float) -> None:
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_disk(self, now: float) -> None:
+        """Drop expired rows and trim the table to its size limit (oldest first)"""
+        self._writes_since_prune = 0
+        if self.ttl_seconds is not None:
+            self._db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,)
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for both tiers"""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._memory),
+        }
+
+
+_caches: Dict[str, ResponseCache] = {}
+_cache_settings: Dict[str, tuple] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str, settings) -> ResponseCache:
+    """
+    Process-wide named cache ("llm", "results", ...) built from a CacheConfig.
+    Rebuilt only when the cache settings themselves change.
+    """
+    key = (settings.max_entries, settings.ttl_seconds, settings.disk, settings.disk_dir, settings.disk_max_entries)
+
+    with _caches_lock:
+        if name not in _caches or _cache_settings[name] != key:
+            disk_path = None
+            if settings.disk:
+                cache_dir = Path(settings.disk_dir).expanduser() if settings.disk_dir else DEFAULT_CACHE_DIR
+                disk_path = cache_dir / f"{name}.sqlite3"
+            _caches[name] = ResponseCache(
+                max_entries=settings.max_entries,
+                ttl_seconds=settings.ttl_seconds,
+                disk_path=disk_path,
+                disk_max_entries=settings.disk_max_entries
+            )
+            _cache_settings[name] = key
+        return _caches[name]
+
+
+def get_llm_cache(settings) -> ResponseCache:
+    """Per-call cache used by call_llm"""
+    return get_cache("llm", settings)
+
+
+def get_result_cache(settings) -> ResponseCache:
+    """Whole-pipeline cache used by PromptifyService"""
+    return get_cache("results", settings)
+
+
+def get_idempotency_cache(settings) -> ResponseCache:
+    """Results stored per Idempotency-Key, kept for settings.idempotency_ttl_seconds"""
+    return get_cache("idempotency", settings.model_copy(update={"ttl_seconds": settings.idempotency_ttl_seconds}))
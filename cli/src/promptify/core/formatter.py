@@ -4,6 +4,13 @@ from rich.console import Console
 from rich.panel import Panel
 import json
 
+def format_usage(usage: dict) -> str:
+    """One-line token and cost summary"""
+    return (
+        f"{usage['total_tokens']:,} tokens ({usage['prompt_tokens']:,} prompt / "
+        f"{usage['completion_tokens']:,} completion) in {usage['calls']} calls, est. ${usage['cost']:.4f}"
+    )
+
 class OutputFormatter(ABC):
     """Abstract base for output formatters"""
     
@@ -35,19 +42,50 @@ class RichFormatter(OutputFormatter):
             border_style="magenta"
         ))
         
+        if result.get("cached"):
+            similarity = result.get("similarity", 1.0)
+            match = "exact match" if similarity >= 1.0 else f"{similarity:.0%} similar query: {result.get('matched_query')!r}"
+            self.console.print(f"[dim]Served from cache, {match} (use --no-cache to re-run)[/dim]")
+        
+        if result.get("truncated"):
+            self.console.print(f"[yellow]Output cut at the max_tokens budget in: {', '.join(result['truncated'])} "
+                               f"(raise it with --max-tokens STAGE=N)[/yellow]")
+        
+        if verbose and result.get("total_usage"):
+            self.console.print(f"[dim]{format_usage(result['total_usage'])}[/dim]")
+            for stage, usage in (result.get("usage") or {}).items():
+                self.console.print(f"[dim]  {stage:<7} {format_usage(usage)}[/dim]")
+        
         return ""  # Rich prints directly
 
 class JSONFormatter(OutputFormatter):
     """JSON output for piping/scripting"""
     
     def format_result(self, result: dict, verbose: bool = False) -> str:
+        return json.dumps(self.to_dict(result, verbose), indent=2)
+    
+    def to_dict(self, result: dict, verbose: bool = False) -> dict:
+        """The JSON-ready payload, also used for batch NDJSON lines"""
         output = {
             "intent": result["intent"],
-            "refined_prompt": result["final_prompt_draft"]
+            "refined_prompt": result["final_prompt_draft"],
+            "cached": result.get("cached", False)
         }
         
+        if result.get("cached"):
+            output["similarity"] = result.get("similarity", 1.0)
+            if result.get("matched_query"):
+                output["matched_query"] = result["matched_query"]
+        
+        if "total_usage" in result:
+            output["usage"] = result["total_usage"]
+        
+        if result.get("truncated"):
+            output["truncated"] = result["truncated"]
+        
         if verbose:
             output["critique"] = result["critique"]
             output["expert_suggestions"] = result["expert_suggestions"]
+            output["stage_usage"] = result.get("usage", {})
         
-        return json.dumps(output, indent=2)
+        return output
@@ -0,0 +1,143 @@
+"""
+Hedged provider calls
+If the primary hasn't answered within a delay, race a secondary against it
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Latency samples kept per primary (provider, model)
+LATENCY_WINDOW = 200
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies, for percentile-based hedge delays"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q-th quantile (0..1) of the window, or None when empty"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class HedgeStats:
+    """Counters for tuning the hedge delay"""
+
+    def __init__(self):
+        self.calls = 0              # Hedging-enabled calls
+        self.fired = 0              # Calls where the secondary was started
+        self.secondary_wins = 0     # ...and it answered first
+        self.primary_wins = 0       # ...but the primary still answered first
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "fired": self.fired,
+            "secondary_wins": self.secondary_wins,
+            "primary_wins": self.primary_wins,
+            "fire_rate": round(self.fired / self.calls, 4) if self.calls else 0.0,
+        }
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+_stats: Dict[str, HedgeStats] = {}
+_registry_lock = threading.Lock()
+
+
+def get_latency_tracker(name: str) -> LatencyTracker:
+    with _registry_lock:
+        return _trackers.setdefault(name, LatencyTracker())
+
+
+def _get_stats(name: str) -> HedgeStats:
+    with _registry_lock:
+        return _stats.setdefault(name, HedgeStats())
+
+
+def get_hedge_stats() -> Dict[str, Dict[str, Any]]:
+    """Hedge counters and the current p90 latency, per primary provider/model"""
+    with _registry_lock:
+        names = list(_stats)
+    report = {}
+    for name in names:
+        tracker = get_latency_tracker(name)
+        report[name] = {
+            **_stats[name].as_dict(),
+            "p90_seconds": tracker.percentile(0.9),
+            "samples": len(tracker),
+        }
+    return report
+
+
+def hedge_delay(name: str, settings) -> float:
+    """Fixed settings.delay, else the primary's observed percentile once enough samples exist"""
+    if settings.delay is not None:
+        return settings.delay
+    tracker = get_latency_tracker(name)
+    if len(tracker) < settings.min_samples:
+        return settings.initial_delay
+    return max(tracker.percentile(settings.percentile), settings.min_delay)
+
+
+async def hedged_call(
+    name: str,
+    primary: Callable[[], Awaitable[Any]],
+    secondary: Callable[[], Awaitable[Any]],
+    delay: float
+) -> Any:
+    """
+    Run primary(); if it hasn't finished after `delay` seconds, also run
+    secondary(). The first successful result wins and the other is
+    cancelled. If one side fails the other is still awaited; if both fail
+    the primary's error is raised.
+    """
+    stats = _get_stats(name)
+    stats.calls += 1
+    tracker = get_latency_tracker(name)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def timed_primary():
+        result = await primary()
+        tracker.record(loop.time() - started)
+        return result
+
+    primary_task = asyncio.ensure_future(timed_primary())
+    secondary_task = None
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            return primary_task.result()
+
+        stats.fired += 1
+        secondary_task = asyncio.ensure_future(secondary())
+        pending = {primary_task, secondary_task}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is primary_task:
+                        stats.primary_wins += 1
+                    else:
+                        stats.secondary_wins += 1
+                    return task.result()
+        return primary_task.result()  # Both failed: surface the primary's error
+    finally:
+        for task in (primary_task, secondary_task):
+            if task is not None and not task.done():
+                task.cancel()
@@ -0,0 +1,144 @@
+"""
+Local intent classifier for the Triage stage
+Keyword/regex scoring over the same cues TRIAGE_AGENT_PROMPT lists, so a
+clear-cut query is routed in microseconds and only ambiguous ones reach
+the LLM
+"""
+
+import json
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from promptify.core.metrics import TRIAGE_DECISIONS
+
+INTENTS = ("ARCHITECT", "BUILDER", "MENTOR", "ANALYST")
+
+# (pattern, weight) per intent. An opening verb is the strongest cue, so
+# patterns anchored at the start of the query weigh more.
+_RULES: Dict[str, List[Tuple[str, float]]] = {
+    "ARCHITECT": [
+        (r"^(design|architect|plan|strategi[sz]e)\b", 3),
+        (r"^how (do|should|would|can) (i|we) (build|design|structure|scale)\b", 3),
+        (r"\b(architecture|system design|roadmap|strategy|blueprint)\b", 2),
+        (r"\b(scalab\w*|microservices?|infrastructure|high[- ]level|trade-?offs?|tech stack)\b", 1),
+        (r"\b(design|plan)\b", 1),
+    ],
+    "BUILDER": [
+        (r"^(write|code|fix|implement|generate|draft|create|build|make|convert|translate|add|refactor)\b", 3),
+        (r"\b(write|code|fix|implement|generate|draft|script)\b", 1),
+        (r"\b(function|class|script|snippet|regex|query|endpoint|component|email|essay|post)\b", 1),
+        (r"\b(in|using) (python|javascript|typescript|java|go|rust|c\+\+|c#|sql|bash)\b", 1),
+    ],
+    "MENTOR": [
+        (r"^(explain|teach|describe|what (is|are|does)|why (is|are|does|do)|how does)\b", 3),
+        (r"\b(difference between|teach me|help me understand|eli5|what is|how does \w+ work)\b", 2),
+        (r"\b(explain|understand|learn|concept|tutorial|beginner)\b", 1),
+    ],
+    "ANALYST": [
+        (r"^(review|analy[sz]e|critique|audit|evaluate|assess|debug|proofread|check)\b", 3),
+        (r"\b(find (the )?(bugs?|errors?|issues?)|what'?s wrong|improve this|give (me )?feedback)\b", 2),
+        (r"\b(review|analy[sz]e|critique|debug|feedback|errors?|bugs?)\b", 1),
+    ],
+}
+
+_COMPILED = {
+    intent: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in rules]
+    for intent, rules in _RULES.items()
+}
+
+
+def classify_intent(query: str) -> Tuple[str, float]:
+    """
+    Best intent for `query` and a confidence in [0, 1).
+
+    Confidence grows with the lead of the top score over the runner-up
+    (a lead of 3, e.g. one opening verb, gives 0.75). With no cue at all
+    it returns the Triage default, ARCHITECT, at confidence 0.
+    """
+    text = query.strip()
+    scores = {
+        intent: sum(weight for pattern, weight in rules if pattern.search(text))
+        for intent, rules in _COMPILED.items()
+    }
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best, top), (_, second) = ranked[0], ranked[1]
+    if top == 0:
+        return "ARCHITECT", 0.0
+    margin = top - second
+    return best, margin / (margin + 1)
+
+
+class TriageStats:
+    """How often the LLM was skipped, and how often the local guess matched it"""
+
+    def __init__(self):
+        self.local = 0              # Decided locally, LLM skipped
+        self.llm = 0                # Sent to the LLM
+        self.agreed = 0             # ...where the local guess matched the LLM
+        self.shadowed = 0           # Confident local guesses checked against the LLM anyway
+        self.shadow_agreed = 0
+        self._lock = threading.Lock()
+
+    def record(self, source: str, local_intent: str, llm_intent: Optional[str] = None, shadow: bool = False) -> None:
+        with self._lock:
+            if source == "local":
+                self.local += 1
+                return
+            self.llm += 1
+            self.agreed += local_intent == llm_intent
+            if shadow:
+                self.shadowed += 1
+                self.shadow_agreed += local_intent == llm_intent
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.local + self.llm
+            return {
+                "local": self.local,
+                "llm": self.llm,
+                "skip_rate": round(self.local / total, 4) if total else 0.0,
+                "agreement_rate": round(self.agreed / self.llm, 4) if self.llm else None,
+                "shadowed": self.shadowed,
+                "shadow_agreement_rate": round(self.shadow_agreed / self.shadowed, 4) if self.shadowed else None,
+            }
+
+
+_stats = TriageStats()
+_log_lock = threading.Lock()
+
+
+def record_triage(source: str, local_intent: str, llm_intent: Optional[str] = None, shadow: bool = False) -> None:
+    """Count one triage decision ("local" or "llm"; the latter with the LLM's intent)"""
+    _stats.record(source, local_intent, llm_intent, shadow)
+    if source == "local":
+        TRIAGE_DECISIONS.inc(source="local", agreement="none")
+    else:
+        TRIAGE_DECISIONS.inc(source="shadow" if shadow else "llm",
+                             agreement="agree" if local_intent == llm_intent else "disagree")
+
+
+def get_triage_stats() -> Dict[str, Any]:
+    """
+    Triage counters for this process. agreement_rate covers every LLM
+    triage (mostly low-confidence queries); shadow_agreement_rate only the
+    confident ones sampled by triage.shadow_rate, i.e. the calls skipping
+    would have decided.
+    """
+    return _stats.as_dict()
+
+
+def log_triage(path: str, query: str, llm_intent: str, local_intent: str, confidence: float) -> None:
+    """Append one labelled example (JSON line) for offline evaluation of the rules"""
+    target = Path(path).expanduser()
+    line = json.dumps({
+        "query": query,
+        "intent": llm_intent,
+        "local_intent": local_intent,
+        "confidence": round(confidence, 4),
+    }, ensure_ascii=False) + "\n"
+    with _log_lock:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, "a", encoding="utf-8") as f:
+            f.write(line)
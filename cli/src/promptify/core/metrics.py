@@ -0,0 +1,177 @@
+"""
+In-process metrics with Prometheus text exposition
+Counters, gauges and histograms keyed by label values. Pure Python, no
+client library or collector needed; render() produces the /metrics body.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; LLM calls range from ~100ms (cached/local) to tens of seconds
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _render_series(self, key, series) -> List[str]:
+        counts, total, count = series
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric so they can be rendered together"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "promptify_stage_duration_seconds", "Wall-clock time of each agent stage", ["stage"]))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "promptify_stage_errors_total", "Agent stages that raised, by exception type", ["stage", "error"]))
+STAGE_IN_FLIGHT = REGISTRY.register(Gauge(
+    "promptify_stage_in_flight", "Agent stages currently running", ["stage"]))
+
+LLM_DURATION = REGISTRY.register(Histogram(
+    "promptify_llm_request_duration_seconds", "Latency of each provider call attempt", ["provider", "model"]))
+LLM_ERRORS = REGISTRY.register(Counter(
+    "promptify_llm_errors_total", "Failed provider call attempts, by exception type", ["provider", "model", "error"]))
+LLM_IN_FLIGHT = REGISTRY.register(Gauge(
+    "promptify_llm_in_flight", "Provider calls currently awaiting a response", ["provider", "model"]))
+LLM_TRUNCATED = REGISTRY.register(Counter(
+    "promptify_llm_truncated_total", "Provider calls that stopped at their max_tokens budget", ["provider", "model", "stage"]))
+
+REFINE_DURATION = REGISTRY.register(Histogram(
+    "promptify_refine_duration_seconds", "End-to-end refinement time", ["outcome"]))
+REFINE_IN_FLIGHT = REGISTRY.register(Gauge(
+    "promptify_refine_in_flight", "Refinements currently running"))
+
+TRIAGE_DECISIONS = REGISTRY.register(Counter(
+    "promptify_triage_decisions_total",
+    "Triage decisions by source (local, llm, shadow) and whether the local guess matched the LLM",
+    ["source", "agreement"]))
+
+
+@contextmanager
+def track(duration: Histogram, errors: Counter, in_flight: Gauge, **labels) -> Iterator[None]:
+    """Time a block into `duration`, count its exceptions in `errors`, and gauge it while running"""
+    in_flight.inc(**labels)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        errors.inc(error=type(e).__name__, **labels)
+        raise
+    finally:
+        in_flight.dec(**labels)
+        duration.observe(time.perf_counter() - start, **labels)
+
+
+def render_metrics(registry: Optional[MetricsRegistry] = None) -> str:
+    """Body for a /metrics endpoint"""
+    return (registry or REGISTRY).render()
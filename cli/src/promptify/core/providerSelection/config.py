@@ -3,12 +3,18 @@
 Configuration using provider registry
 """
 
+import threading
 from pathlib import Path
-from typing import Optional, Literal
+from typing import Any, Dict, List, Optional, Literal, Tuple
 import yaml
-from pydantic import BaseModel, Field, PrivateAttr
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
+
+ProviderType = Literal["cerebras", "openai", "anthropic", "gemini", "local", "replay"]
+
+# Agent stages that call a model ("analyze" only runs in fast mode)
+STAGES = ("triage", "critic", "expert", "smith", "analyze")
+StageName = Literal["triage", "critic", "expert", "smith", "analyze"]
 
-ProviderType = Literal["cerebras", "openai", "anthropic", "gemini", "local"]
 MODEL_PRESETS = {
     # Cerebras (DEFAULT - free tier)
     "default": {"provider": "cerebras", "model": "cerebras/llama3.1-8b"},
@@ -28,60 +34,262 @@ MODEL_PRESETS = {
     "gemini-pro": {"provider": "gemini", "model": "gemini/gemini-1.5-pro"},
 }
 
+class PoolConfig(BaseModel):
+    """HTTP connection pool kept by each provider"""
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0      # Seconds an idle connection is kept open
+    http2: bool = True                  # Used when the endpoint and the `h2` package support it
+
+
+class RetryConfig(BaseModel):
+    """Retry policy for failed provider calls"""
+    max_attempts: int = 4               # Total tries, including the first
+    base_delay: float = 1.0             # Seconds; doubles after each failure
+    max_delay: float = 30.0             # Cap per wait; a longer Retry-After fails fast instead
+    jitter: float = 0.5                 # Randomly shave up to this fraction off each wait
+    retry_on: List[int] = Field(default_factory=lambda: [408, 409, 429, 500, 502, 503, 504])
+
+
+def _default_provider_retry() -> Dict[str, RetryConfig]:
+    # Cerebras' free tier rate-limits aggressively but recovers within seconds
+    return {"cerebras": RetryConfig(max_attempts=6, base_delay=2.0, max_delay=60.0)}
+
+
+class HedgeConfig(BaseModel):
+    """Race a secondary model when the primary is slow (non-streaming calls only)"""
+    enabled: bool = False
+    secondary: str = "cerebras-70b"     # Key in MODEL_PRESETS
+    delay: Optional[float] = None       # Fixed seconds; None = the primary's observed `percentile`
+    percentile: float = 0.9
+    min_samples: int = 20               # Use initial_delay until this many latencies are seen
+    initial_delay: float = 2.0
+    min_delay: float = 0.1
+
+
+class RateLimitConfig(BaseModel):
+    """Per-provider budget shared by every Promptify process on this host"""
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+
+
+class ReplayConfig(BaseModel):
+    """Cassette used by the `replay` provider"""
+    mode: Literal["record", "replay"] = "replay"
+    cassette: Optional[str] = None      # Default: ~/.promptify/cassettes/cassette.jsonl
+    record_provider: str = "cerebras"   # Real provider called (and recorded) in record mode
+    latency: Optional[float] = 0.0      # Seconds per replayed call; None = the recorded latency
+
+
+def _default_stage_max_tokens() -> Dict[str, Optional[int]]:
+    # Triage answers with one word; the others are sized to what their prompts ask for
+    return {"triage": 8, "critic": 512, "expert": 768, "analyze": 1024, "smith": 2048}
+
+
+class StageModelConfig(BaseModel):
+    """Per-stage override; unset fields fall back to the model section"""
+    preset: Optional[str] = None        # Key in MODEL_PRESETS (sets provider and model)
+    provider: Optional[ProviderType] = None
+    model: Optional[str] = None
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    api_base: Optional[str] = None      # For a local/custom endpoint serving this stage
+    
+    @field_validator("preset")
+    @classmethod
+    def _known_preset(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None and value not in MODEL_PRESETS:
+            raise ValueError(f"unknown preset '{value}' (available: {', '.join(MODEL_PRESETS)})")
+        return value
+
+
 class ModelConfig(BaseModel):
     """Model configuration"""
     provider: ProviderType = "cerebras"  # DEFAULT: Cerebras (free tier)
     model: str = "cerebras/llama3.1-8b"
     temperature: float = 0.7
-    max_tokens: Optional[int] = None
+    max_tokens: Optional[int] = None    # Cap on every stage's output-token budget
     
     # For local/custom endpoints
     api_base: Optional[str] = None
     api_key: Optional[str] = None
+    
+    timeout: Optional[float] = None     # Seconds per provider call (None = litellm's default)
+    
+    # Reuse responses for identical requests (see PromptifyConfig.cache)
+    cache: bool = True
+    
+    pool: PoolConfig = Field(default_factory=PoolConfig)
+    
+    # Default retry policy, and per-provider overrides keyed by provider name
+    retry: RetryConfig = Field(default_factory=RetryConfig)
+    provider_retry: Dict[str, RetryConfig] = Field(default_factory=_default_provider_retry)
+    
+    hedge: HedgeConfig = Field(default_factory=HedgeConfig)
+    
+    # Budgets keyed by provider name, e.g. {"cerebras": {"requests_per_minute": 30}}
+    rate_limits: Dict[str, RateLimitConfig] = Field(default_factory=dict)
+    rate_limit_path: Optional[str] = None   # Default: ~/.promptify/ratelimit.sqlite3
+    
+    replay: ReplayConfig = Field(default_factory=ReplayConfig)
+    
+    # Per-stage routing, e.g. {"triage": {"preset": "cerebras-8b"}, "smith": {"preset": "gpt-4o"}}
+    stages: Dict[StageName, StageModelConfig] = Field(default_factory=dict)
+    
+    # Default output-token budget per stage (None = no limit); stages[...].max_tokens wins
+    stage_max_tokens: Dict[StageName, Optional[int]] = Field(default_factory=_default_stage_max_tokens)
+    
+    def retry_policy(self, provider: str) -> RetryConfig:
+        """Retry policy for `provider`, falling back to the default"""
+        return self.provider_retry.get(provider, self.retry)
+    
+    def stage_route(self, stage: Optional[str]) -> Dict[str, Any]:
+        """
+        Provider, model, temperature, max_tokens and api_base for `stage`.
+        
+        A stage's preset is applied first, then its explicit fields; anything
+        left unset comes from this section. max_tokens defaults to
+        stage_max_tokens and is capped by this section's max_tokens.
+        api_base is only set by the stage.
+        """
+        route = {
+            "provider": self.provider,
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.cap_tokens(self.stage_max_tokens.get(stage)),
+            "api_base": None,
+        }
+        override = self.stages.get(stage) if stage else None
+        if override is None:
+            return route
+        if override.preset:
+            route.update(MODEL_PRESETS[override.preset])
+        for field in ("provider", "model", "temperature", "max_tokens", "api_base"):
+            value = getattr(override, field)
+            if value is not None:
+                route[field] = value
+        route["max_tokens"] = self.cap_tokens(route["max_tokens"])
+        return route
+    
+    def cap_tokens(self, limit: Optional[int]) -> Optional[int]:
+        """An output-token budget (None = unlimited) held to max_tokens, if set"""
+        if self.max_tokens and limit:
+            return min(limit, self.max_tokens)
+        return limit or self.max_tokens
+
+
+class CacheConfig(BaseModel):
+    """LLM response cache limits"""
+    max_entries: int = 1024             # In-memory LRU size
+    ttl_seconds: Optional[float] = 86400
+    disk: bool = False                  # Also persist to SQLite
+    disk_dir: Optional[str] = None      # Default: ~/.promptify/cache
+    disk_max_entries: int = 100_000
+    
+    # Opt-in: reuse a refinement for a near-identical query (MinHash similarity,
+    # e.g. 0.9), unless numbers, negations or opposite words differ.
+    # null = only reuse exact matches.
+    near_duplicate_threshold: Optional[float] = None
+    near_duplicate_max_entries: int = 10_000
+    
+    # How long a result is replayed for a repeated Idempotency-Key
+    idempotency_ttl_seconds: float = 600
+
+
+class TriageConfig(BaseModel):
+    """When the Triage stage may skip its LLM call"""
+    # Use the local classifier's intent at or above this confidence; null = always ask the LLM
+    local_threshold: Optional[float] = 0.75
+    shadow_rate: float = 0.0            # Fraction of confident queries still sent to the LLM, to measure agreement
+    log_path: Optional[str] = None      # Append every LLM triage (with the local guess) here as JSON lines
+
+
+# Search order: local first, then global
+CONFIG_SEARCH_PATHS = [
+    Path("config.yml"),
+    Path("config.yaml"),
+    Path.home() / ".promptify" / "config.yml",
+    Path.home() / ".promptify" / "config.yaml"
+]
+
+# Process-wide cache: resolved path -> (mtime, parsed config)
+_CONFIG_CACHE: Dict[Path, Tuple[int, "PromptifyConfig"]] = {}
+_CACHE_LOCK = threading.Lock()
+_DOTENV_LOADED = False
+
+
+def _load_dotenv_once() -> None:
+    """Load environment variables from .env the first time a config is needed"""
+    global _DOTENV_LOADED
+    if _DOTENV_LOADED:
+        return
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass # dotenv not installed, hopefully env vars are set otherwise
+    _DOTENV_LOADED = True
 
 
 class PromptifyConfig(BaseModel):
     """Main config"""
     model: ModelConfig = Field(default_factory=ModelConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    triage: TriageConfig = Field(default_factory=TriageConfig)
     verbose: bool = False
     
     _source_path: Optional[Path] = PrivateAttr(default=None)
     
     @classmethod
     def load(cls, config_path: Optional[Path] = None) -> "PromptifyConfig":
-        # Load environment variables from .env if present
-        try:
-            from dotenv import load_dotenv
-            load_dotenv()
-        except ImportError:
-            pass # dotenv not installed, hopefully env vars are set otherwise
-
-        if config_path is not None:
-             if config_path.exists():
-                with open(config_path) as f:
-                    data = yaml.safe_load(f) or {}
-                obj = cls(**data)
-                obj._source_path = config_path
-                return obj
-             return cls()
-
-        # Search order: local first, then global
-        paths = [
-            Path("config.yml"),
-            Path("config.yaml"),
-            Path.home() / ".promptify" / "config.yml",
-            Path.home() / ".promptify" / "config.yaml"
-        ]
-
-        for path in paths:
-            if path.exists():
-                with open(path) as f:
-                    data = yaml.safe_load(f) or {}
-                obj = cls(**data)
-                obj._source_path = path
-                return obj
+        """
+        Load config, re-parsing the YAML only when the file's mtime changes.
         
-        return cls()  # Default: Cerebras free tier
+        Returns a private copy, so callers may mutate and save it freely.
+        """
+        _load_dotenv_once()
+
+        if config_path is None:
+            config_path = next((p for p in CONFIG_SEARCH_PATHS if p.exists()), None)
+            if config_path is None:
+                return cls()  # Default: Cerebras free tier
+
+        try:
+            resolved = config_path.resolve()
+            mtime = resolved.stat().st_mtime_ns
+        except OSError:
+            return cls()
+
+        with _CACHE_LOCK:
+            cached = _CONFIG_CACHE.get(resolved)
+        if cached is None or cached[0] != mtime:
+            with open(resolved) as f:
+                data = yaml.safe_load(f) or {}
+            obj = cls(**data)
+            obj._source_path = config_path
+            with _CACHE_LOCK:
+                _CONFIG_CACHE[resolved] = (mtime, obj)
+            cached = (mtime, obj)
+
+        copy = cached[1].model_copy(deep=True)
+        copy._source_path = config_path
+        return copy
+    
+    @classmethod
+    def load_or_default(cls, config_path: Optional[Path] = None) -> "PromptifyConfig":
+        """Load config, falling back to defaults (Cerebras/Free) if it is unreadable"""
+        try:
+            return cls.load(config_path)
+        except Exception as e:
+            print(f"⚠️ [Config] Warning: {e}. Using defaults.")
+            return cls()
+    
+    @classmethod
+    def reload(cls, config_path: Optional[Path] = None) -> "PromptifyConfig":
+        """Drop every cached config and load again from disk"""
+        with _CACHE_LOCK:
+            _CONFIG_CACHE.clear()
+        return cls.load(config_path)
     
     def save(self, config_path: Optional[Path] = None):
         target_path = config_path or self._source_path
@@ -92,4 +300,9 @@ class PromptifyConfig(BaseModel):
         target_path.parent.mkdir(parents=True, exist_ok=True)
         
         with open(target_path, 'w') as f:
-            yaml.dump(self.model_dump(), f)
\ No newline at end of file
+            # Only what differs from the defaults, so later default changes still apply
+            yaml.dump(self.model_dump(exclude_defaults=True), f)
+        
+        # Drop the cached entry so the next load re-reads what we just wrote
+        with _CACHE_LOCK:
+            _CONFIG_CACHE.pop(target_path.resolve(), None)
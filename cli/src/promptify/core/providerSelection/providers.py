@@ -3,10 +3,19 @@ Provider registry for LLM backends
 Clean, extensible, no over-engineering
 """
 
+import asyncio
+import importlib.util
 import os
-from typing import Dict, Any, Protocol
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Protocol
+
+import httpx
 import litellm
 
+from promptify.core.providerSelection.replay import ReplayProvider
+
 
 class ProviderConfig(Protocol):
     """Protocol for provider configurations"""
@@ -15,14 +24,181 @@ class ProviderConfig(Protocol):
         ...
 
 
-class CerebrasProvider:
+DEFAULT_POOL = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0,
+    "http2": True,
+}
+
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_ssl_context = None
+
+
+def _shared_ssl_context():
+    """One SSL context for every pool; building one costs ~50ms (CA bundle load)"""
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = httpx.create_ssl_context()
+    return _ssl_context
+
+
+# Pooled httpx clients shared by every provider instance with the same
+# endpoint and pool settings (e.g. one per user key on the backend), per
+# event loop: (provider name, api_base, pool, loop) -> client
+MAX_TRANSPORTS = 64
+_TRANSPORTS: "OrderedDict[tuple, httpx.AsyncClient]" = OrderedDict()
+_TRANSPORT_STATS: Dict[str, Dict[str, int]] = {}
+_TRANSPORT_LOCK = threading.Lock()
+_closing = set()  # Keeps scheduled aclose() tasks alive until they finish
+
+
+def _close_client(loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient) -> None:
+    """aclose() a client on the loop that owns it (dropped if that loop is gone)"""
+    if loop.is_closed() or client.is_closed:
+        return
+    
+    def schedule():
+        task = loop.create_task(client.aclose())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+    
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        schedule()
+    else:
+        loop.call_soon_threadsafe(schedule)
+
+
+def _evict_transports() -> None:
+    """Forget clients of closed loops and close the least recently used beyond MAX_TRANSPORTS (lock held)"""
+    for key in [key for key in _TRANSPORTS if key[-1].is_closed()]:
+        del _TRANSPORTS[key]
+    while len(_TRANSPORTS) > MAX_TRANSPORTS:
+        (*_, loop), client = _TRANSPORTS.popitem(last=False)
+        _close_client(loop, client)
+
+
+async def aclose_all() -> None:
+    """
+    Close the pooled clients owned by the running event loop.
+    
+    Call before the loop ends (e.g. at the end of an asyncio.run, or at
+    server shutdown) so keep-alive sockets are closed cleanly.
+    """
+    loop = asyncio.get_running_loop()
+    with _TRANSPORT_LOCK:
+        keys = [key for key in _TRANSPORTS if key[-1] is loop]
+        clients = [_TRANSPORTS.pop(key) for key in keys]
+    await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+
+class PooledHTTPClient:
+    """
+    Mixin giving a provider a long-lived, pooled HTTP client that litellm
+    reuses, so keep-alive connections (and TLS sessions) survive across calls.
+    
+    httpx clients are bound to the event loop that created them, so one
+    client is kept per running loop. The httpx client is shared by every
+    provider instance with the same name, endpoint and pool settings; only
+    the thin SDK wrapper holding the API key is per instance.
+    """
+    
+    name = "openai"              # Provider name, for the shared transport and stats
+    client_kind = "openai"       # "openai": litellm wants an AsyncOpenAI; "httpx": an AsyncHTTPHandler
+    supports_http2 = True
+    api_key_env: Optional[str] = None
+    
+    def _init_pool(self, pool: Optional[Dict[str, Any]] = None):
+        self.pool = {**DEFAULT_POOL, **(pool or {})}
+        self._clients = weakref.WeakKeyDictionary()  # event loop -> (httpx client, litellm client)
+    
+    def _build_http_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.pool["max_connections"],
+            max_keepalive_connections=self.pool["max_keepalive_connections"],
+            keepalive_expiry=self.pool["keepalive_expiry"],
+        )
+        http2 = self.pool["http2"] and self.supports_http2 and _HTTP2_AVAILABLE
+        stats = _TRANSPORT_STATS.setdefault(self.name, {"requests": 0, "connections_opened": 0})
+        
+        async def trace(event_name: str, info: dict) -> None:
+            if event_name == "connection.connect_tcp.complete":
+                stats["connections_opened"] += 1
+        
+        async def on_request(request: httpx.Request) -> None:
+            stats["requests"] += 1
+            request.extensions["trace"] = trace
+        
+        return httpx.AsyncClient(
+            limits=limits,
+            http2=http2,
+            verify=_shared_ssl_context(),
+            event_hooks={"request": [on_request]},
+        )
+    
+    def _http_client(self, loop: asyncio.AbstractEventLoop) -> httpx.AsyncClient:
+        """The shared pooled client for this provider's endpoint on `loop`"""
+        key = (self.name, self.api_base, _freeze(self.pool), loop)
+        with _TRANSPORT_LOCK:
+            client = _TRANSPORTS.get(key)
+            if client is None or client.is_closed:
+                client = self._build_http_client()
+                _TRANSPORTS[key] = client
+                _evict_transports()
+            else:
+                _TRANSPORTS.move_to_end(key)
+        return client
+    
+    def litellm_client(self) -> Optional[Any]:
+        """Client object to pass as litellm's `client=`, or None outside an event loop"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        
+        http_client = self._http_client(loop)
+        cached = self._clients.get(loop)
+        if cached is not None and cached[0] is http_client:
+            return cached[1]
+        
+        if self.client_kind == "openai":
+            api_key = self.api_key or (os.getenv(self.api_key_env) if self.api_key_env else None)
+            if not api_key:
+                return None  # Let litellm raise its usual missing-key error
+            from openai import AsyncOpenAI
+            # Never close() this wrapper: that would close the shared http_client
+            client = AsyncOpenAI(api_key=api_key, base_url=self.api_base, http_client=http_client, max_retries=0)
+        else:
+            from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+            client = AsyncHTTPHandler()
+            client.client = http_client
+        self._clients[loop] = (http_client, client)
+        return client
+    
+    def _with_client(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        client = self.litellm_client()
+        if client is not None:
+            params["client"] = client
+        return params
+
+
+class CerebrasProvider(PooledHTTPClient):
     """Cerebras Cloud provider (DEFAULT)"""
     
-    def __init__(self, model: str = "cerebras/llama3.1-8b", temperature: float = 0.7, api_key: str = None, api_base: str = None):
+    name = "cerebras"
+    api_key_env = "CEREBRAS_API_KEY"
+    
+    def __init__(self, model: str = "cerebras/llama3.1-8b", temperature: float = 0.7, api_key: str = None, api_base: str = None, pool: Dict[str, Any] = None):
         self.model = model
         self.temperature = temperature
         self.api_key = api_key
         self.api_base = api_base or "https://api.cerebras.ai/v1"
+        self._init_pool(pool)
     
     def get_litellm_params(self) -> Dict[str, Any]:
         params = {
@@ -34,17 +210,21 @@ class CerebrasProvider:
         }
         if self.api_key:
             params["api_key"] = self.api_key
-        return params
+        return self._with_client(params)
 
 
-class OpenAIProvider:
+class OpenAIProvider(PooledHTTPClient):
     """OpenAI provider"""
     
-    def __init__(self, model: str = "gpt-3.5-turbo", temperature: float = 0.7, api_key: str = None, api_base: str = None):
+    name = "openai"
+    api_key_env = "OPENAI_API_KEY"
+    
+    def __init__(self, model: str = "gpt-3.5-turbo", temperature: float = 0.7, api_key: str = None, api_base: str = None, pool: Dict[str, Any] = None):
         self.model = model
         self.temperature = temperature
         self.api_key = api_key
         self.api_base = api_base
+        self._init_pool(pool)
     
     def get_litellm_params(self) -> Dict[str, Any]:
         params = {
@@ -55,17 +235,21 @@ class OpenAIProvider:
             params["api_key"] = self.api_key
         if self.api_base:
             params["api_base"] = self.api_base
-        return params
+        return self._with_client(params)
 
 
-class AnthropicProvider:
+class AnthropicProvider(PooledHTTPClient):
     """Anthropic Claude provider"""
     
-    def __init__(self, model: str = "claude-3-5-sonnet-20241022", temperature: float = 0.7, api_key: str = None, api_base: str = None):
+    name = "anthropic"
+    client_kind = "httpx"
+    
+    def __init__(self, model: str = "claude-3-5-sonnet-20241022", temperature: float = 0.7, api_key: str = None, api_base: str = None, pool: Dict[str, Any] = None):
         self.model = model
         self.temperature = temperature
         self.api_key = api_key
         self.api_base = api_base
+        self._init_pool(pool)
     
     def get_litellm_params(self) -> Dict[str, Any]:
         params = {
@@ -76,17 +260,21 @@ class AnthropicProvider:
             params["api_key"] = self.api_key
         if self.api_base:
             params["api_base"] = self.api_base
-        return params
+        return self._with_client(params)
 
 
-class GeminiProvider:
+class GeminiProvider(PooledHTTPClient):
     """Google Gemini provider"""
     
-    def __init__(self, model: str = "gemini/gemini-1.5-flash", temperature: float = 0.7, api_key: str = None, api_base: str = None):
+    name = "gemini"
+    client_kind = "httpx"
+    
+    def __init__(self, model: str = "gemini/gemini-1.5-flash", temperature: float = 0.7, api_key: str = None, api_base: str = None, pool: Dict[str, Any] = None):
         self.model = model
         self.temperature = temperature
         self.api_key = api_key
         self.api_base = api_base
+        self._init_pool(pool)
     
     def get_litellm_params(self) -> Dict[str, Any]:
         params = {
@@ -98,34 +286,39 @@ class GeminiProvider:
             params["api_key"] = self.api_key
         if self.api_base:
             params["api_base"] = self.api_base
-        return params
+        return self._with_client(params)
 
 
-class OpenAICompatibleProvider:
+class OpenAICompatibleProvider(PooledHTTPClient):
     """
     Generic OpenAI-compatible endpoint
     For local models (LM Studio, vLLM, Ollama with OpenAI compat, etc.)
     """
     
+    name = "local"
+    supports_http2 = False  # Most local servers only speak HTTP/1.1
+    
     def __init__(
         self,
         model: str = "local-model",
         api_base: str ="http://localhost:8000/v1",
         temperature: float = 0.7,
-        api_key: str = "not-needed"
+        api_key: str = "not-needed",
+        pool: Dict[str, Any] = None
     ):
         self.model = model
         self.api_base = api_base
         self.temperature = temperature
         self.api_key = api_key
+        self._init_pool(pool)
     
     def get_litellm_params(self) -> Dict[str, Any]:
-        return {
+        return self._with_client({
             "model": f"openai/{self.model}",  # LiteLLM uses openai/ prefix for custom endpoints
             "api_base": self.api_base,
             "api_key": self.api_key,
             "temperature": self.temperature
-        }
+        })
 
 
 # Provider Registry
@@ -135,13 +328,32 @@ PROVIDER_REGISTRY: Dict[str, type] = {
     "anthropic": AnthropicProvider,
     "gemini": GeminiProvider,
     "local": OpenAICompatibleProvider,  # For OpenAI-compatible local models
+    "replay": ReplayProvider,           # Recorded responses (see replay.py)
 }
 
 
+# Provider instances are cached by their parameters. They hold no sockets of
+# their own (see _TRANSPORTS), so evicting one needs no cleanup.
+MAX_CACHED_PROVIDERS = 256
+_PROVIDER_CACHE: "OrderedDict[tuple, ProviderConfig]" = OrderedDict()
+_PROVIDER_CACHE_LOCK = threading.Lock()
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable form of provider kwargs (dicts become sorted tuples)"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
 def get_provider(provider_name: str, **kwargs) -> ProviderConfig:
     """
     Factory function to get provider instance
     
+    Instances are cached per (provider, parameters); all instances for the
+    same endpoint share one pooled HTTP client per event loop, whatever
+    their API key.
+    
     Examples:
         get_provider("cerebras", model="cerebras/llama3.1-70b")
         get_provider("openai", model="gpt-4")
@@ -155,4 +367,23 @@ def get_provider(provider_name: str, **kwargs) -> ProviderConfig:
             f"Available: {', '.join(PROVIDER_REGISTRY.keys())}"
         )
     
-    return provider_class(**kwargs)
+    key = (provider_name, _freeze(kwargs))
+    with _PROVIDER_CACHE_LOCK:
+        provider = _PROVIDER_CACHE.get(key)
+        if provider is None:
+            provider = provider_class(**kwargs)
+            _PROVIDER_CACHE[key] = provider
+            while len(_PROVIDER_CACHE) > MAX_CACHED_PROVIDERS:
+                _PROVIDER_CACHE.popitem(last=False)
+        else:
+            _PROVIDER_CACHE.move_to_end(key)
+    return provider
+
+
+def get_pool_stats() -> Dict[str, Dict[str, int]]:
+    """Connection-reuse counters per provider name (summed over its shared clients)"""
+    with _TRANSPORT_LOCK:
+        return {
+            provider_name: {**stats, "reused": max(stats["requests"] - stats["connections_opened"], 0)}
+            for provider_name, stats in _TRANSPORT_STATS.items()
+        }
@@ -0,0 +1,149 @@
+"""
+Cross-process rate limiting for provider calls
+Token buckets per provider, stored in SQLite so every worker and `batch`
+process on the host draws from the same budget
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_RATE_LIMIT_PATH = Path.home() / ".promptify" / "ratelimit.sqlite3"
+
+# Output tokens assumed for a call without max_tokens; corrected from usage afterwards
+DEFAULT_COMPLETION_ESTIMATE = 512
+
+# SQLite busy timeout per attempt, and how long to keep retrying a locked store
+BUSY_TIMEOUT = 0.05
+LOCK_RETRY_SECONDS = 30.0
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token count of a text (~4 characters per token), with no tokenizer to load"""
+    return len(text) // 4
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> int:
+    """Rough token count for budgeting (prompt plus the expected completion)"""
+    prompt = approx_tokens("".join(str(m.get("content", "")) for m in messages))
+    return prompt + (max_tokens or DEFAULT_COMPLETION_ESTIMATE)
+
+
+class RateLimiter:
+    """
+    Token buckets with reservation: a caller takes its share immediately,
+    letting the bucket go negative, and sleeps until that debt would have
+    refilled. Callers across processes are therefore served in arrival
+    order, and nobody fails for lack of capacity.
+    """
+
+    def __init__(self, path: Path = DEFAULT_RATE_LIMIT_PATH):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # Setup may wait; bucket updates fail fast and are retried by _atake
+        self._db.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}")
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _take(self, name: str, amount: float, per_minute: int) -> float:
+        """Withdraw `amount` from bucket `name`; returns the time (epoch seconds) it is covered at"""
+        per_second = per_minute / 60.0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")  # Serializes the read-modify-write across processes
+            try:
+                now = time.time()
+                row = self._db.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+                tokens = per_minute if row is None else min(per_minute, row[0] + (now - row[1]) * per_second)
+                tokens -= amount
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    (name, tokens, now)
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return now + max(0.0, -tokens / per_second)
+
+    async def _atake(self, name: str, amount: float, per_minute: int) -> float:
+        """
+        _take in a worker thread, so SQLite I/O never blocks the event loop.
+        A store locked by another process is retried with backoff here
+        rather than waited on inside SQLite, which would tie up the thread.
+        """
+        deadline = time.monotonic() + LOCK_RETRY_SECONDS
+        delay = BUSY_TIMEOUT
+        while True:
+            try:
+                return await asyncio.to_thread(self._take, name, amount, per_minute)
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or time.monotonic() >= deadline:
+                    raise
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    async def acquire(self, provider: str, budget, tokens: int = 0) -> float:
+        """
+        Wait until `provider` has capacity for one request of ~`tokens`
+        tokens under `budget` (a RateLimitConfig). Returns the seconds waited.
+        """
+        granted_at = 0.0
+        if budget.requests_per_minute:
+            granted_at = max(granted_at, await self._atake(f"{provider}:requests", 1, budget.requests_per_minute))
+        if budget.tokens_per_minute and tokens:
+            granted_at = max(granted_at, await self._atake(f"{provider}:tokens", tokens, budget.tokens_per_minute))
+        wait = max(0.0, granted_at - time.time())
+
+        stats = self._stats.setdefault(provider, {"acquired": 0, "waited": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0})
+        stats["acquired"] += 1
+        if wait > 0:
+            stats["waited"] += 1
+            stats["wait_seconds"] += wait
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait)
+            await asyncio.sleep(wait)
+        return wait
+
+    async def adjust(self, provider: str, budget, delta_tokens: int) -> None:
+        """Correct a token estimate once actual usage is known (negative refunds)"""
+        if budget.tokens_per_minute and delta_tokens:
+            await self._atake(f"{provider}:tokens", delta_tokens, budget.tokens_per_minute)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-provider acquisitions, how many had to wait, and for how long (this process)"""
+        return {
+            provider: {**counters, "wait_seconds": round(counters["wait_seconds"], 3),
+                       "max_wait_seconds": round(counters["max_wait_seconds"], 3)}
+            for provider, counters in self._stats.items()
+        }
+
+
+_limiters: Dict[Path, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(path: Optional[str] = None) -> RateLimiter:
+    """Process-wide limiter for the given store (default ~/.promptify/ratelimit.sqlite3)"""
+    resolved = Path(path).expanduser() if path else DEFAULT_RATE_LIMIT_PATH
+    with _limiters_lock:
+        if resolved not in _limiters:
+            _limiters[resolved] = RateLimiter(resolved)
+        return _limiters[resolved]
+
+
+def get_rate_limit_stats() -> Dict[str, Dict[str, float]]:
+    """Wait-time counters of every limiter opened in this process, per provider"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    report: Dict[str, Dict[str, float]] = {}
+    for limiter in limiters:
+        report.update(limiter.stats())
+    return report
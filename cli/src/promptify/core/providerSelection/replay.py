@@ -0,0 +1,207 @@
+"""
+Record/replay provider
+Record mode wraps a real provider and appends every response to a cassette
+(JSON lines keyed by message hash); replay mode serves them back from disk,
+so the pipeline can run deterministically without network or API credits
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import litellm
+
+from promptify.utils.errors import APIError
+
+DEFAULT_CASSETTE_PATH = Path.home() / ".promptify" / "cassettes" / "cassette.jsonl"
+
+
+def cassette_key(messages: List[Dict[str, str]]) -> str:
+    """Stable hash of a chat request's messages"""
+    payload = json.dumps(messages, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Recorded responses in an append-only JSON lines file.
+
+    The file is re-read when it changes on disk, so several processes can
+    record into one cassette. A later recording of the same messages wins.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._entries: Dict[str, dict] = {}
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        entries = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A record cut short by a crash; skip it
+                entries[entry["key"]] = entry
+        self._entries, self._mtime = entries, mtime
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            self._refresh()
+            return self._entries.get(key)
+
+    def put(self, entry: dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # One write() per record keeps concurrent appenders from interleaving
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._entries[entry["key"]] = entry
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._entries)
+
+
+_cassettes: Dict[Path, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: Optional[str] = None) -> Cassette:
+    """Process-wide cassette for the given file (default ~/.promptify/cassettes/cassette.jsonl)"""
+    resolved = Path(path).expanduser().resolve() if path else DEFAULT_CASSETTE_PATH
+    with _cassettes_lock:
+        if resolved not in _cassettes:
+            _cassettes[resolved] = Cassette(resolved)
+        return _cassettes[resolved]
+
+
+class ReplayProvider:
+    """
+    Deterministic, zero-cost provider backed by a cassette.
+
+    mode="record": calls `record_provider` for real and stores each answer.
+    mode="replay": answers from the cassette only, after `latency` seconds
+    (None = the latency measured when it was recorded). A request that was
+    never recorded fails with an APIError rather than reaching the network.
+
+    Completions are served through the `acompletion` entry of the litellm
+    params, which call_llm uses in place of litellm.acompletion.
+    """
+
+    def __init__(
+        self,
+        model: str = "cerebras/llama3.1-8b",
+        temperature: float = 0.7,
+        api_key: str = None,
+        api_base: str = None,
+        pool: Dict[str, Any] = None,
+        mode: str = "replay",
+        cassette: Optional[str] = None,
+        record_provider: str = "cerebras",
+        latency: Optional[float] = 0.0,
+    ):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown replay mode: {mode}. Available: record, replay")
+        if record_provider == "replay":
+            raise ValueError("The replay provider cannot record itself")
+        self.model = model
+        self.temperature = temperature
+        self.mode = mode
+        self.latency = latency
+        self.cassette = get_cassette(cassette)
+        self.record_provider = record_provider
+        self.record_kwargs = {"model": model, "temperature": temperature, "pool": pool}
+        if api_key:
+            self.record_kwargs["api_key"] = api_key
+        if api_base:
+            self.record_kwargs["api_base"] = api_base
+
+    def get_litellm_params(self) -> Dict[str, Any]:
+        if self.mode == "record":
+            # Looked up per call (not in __init__, which runs under get_provider's lock)
+            from promptify.core.providerSelection.providers import get_provider
+            inner = get_provider(self.record_provider, **self.record_kwargs)
+            return {**inner.get_litellm_params(), "acompletion": self._record}
+        return {"model": self.model, "temperature": self.temperature, "acompletion": self._replay}
+
+    async def _record(self, messages: List[Dict[str, str]], stream: bool = False, **params) -> Any:
+        start = time.perf_counter()
+        response = await litellm.acompletion(messages=messages, stream=stream, **params)
+        if stream:
+            return self._record_stream(messages, params["model"], response, start)
+
+        usage = getattr(response, "usage", None)
+        self._store(messages, params["model"], response.choices[0].message.content or "", usage, start)
+        return response
+
+    async def _record_stream(self, messages: List[Dict[str, str]], model: str, response: Any, start: float) -> AsyncIterator[Any]:
+        parts = []
+        usage = None
+        async for chunk in response:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+        self._store(messages, model, "".join(parts), usage, start)
+
+    def _store(self, messages: List[Dict[str, str]], model: str, content: str, usage: Any, start: float) -> None:
+        self.cassette.put({
+            "key": cassette_key(messages),
+            "model": model,
+            "messages": messages,
+            "content": content,
+            "usage": {
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens or 0,
+            } if getattr(usage, "prompt_tokens", None) is not None else None,
+            "latency": round(time.perf_counter() - start, 4),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+
+    async def _replay(self, messages: List[Dict[str, str]], stream: bool = False, **params) -> Any:
+        entry = self.cassette.get(cassette_key(messages))
+        if entry is None:
+            raise APIError(
+                f"replay: no recorded response for this request in {self.cassette.path}",
+                hint="Record it first with model.replay.mode: record (the prompts or model inputs may have changed)"
+            )
+
+        delay = entry.get("latency", 0.0) if self.latency is None else self.latency
+        if delay:
+            await asyncio.sleep(delay)
+
+        # litellm builds the response (or stream) objects without touching the network
+        response = await litellm.acompletion(
+            model=entry.get("model") or self.model,
+            custom_llm_provider="openai",
+            messages=messages,
+            mock_response=entry["content"],
+            stream=stream,
+        )
+        if not stream and entry.get("usage"):
+            usage = entry["usage"]
+            response.usage = litellm.Usage(
+                prompt_tokens=usage["prompt_tokens"],
+                completion_tokens=usage["completion_tokens"],
+                total_tokens=usage["prompt_tokens"] + usage["completion_tokens"],
+            )
+        return response
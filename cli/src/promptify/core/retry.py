@@ -0,0 +1,122 @@
+"""
+Retry with exponential backoff for provider calls
+Honors Retry-After and surfaces the final failure as a typed APIError
+"""
+
+import asyncio
+import email.utils
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from promptify.utils.errors import APIError, rate_limit_error
+
+# Raised for dropped connections / timeouts, which carry no useful status code
+_TRANSIENT_ERRORS = ("APIConnectionError", "Timeout", "ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError")
+
+
+def status_code_of(error: Exception) -> Optional[int]:
+    """HTTP status of a provider error, if it carries one"""
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+        if isinstance(value, str) and value.isdigit():
+            return int(value)
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def retry_after_of(error: Exception) -> Optional[float]:
+    """Seconds from the error's Retry-After (or retry-after-ms) header, if any"""
+    headers = getattr(error, "litellm_response_headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return max(float(value) / 1000, 0.0)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+
+    # HTTP-date form: "Wed, 21 Oct 2026 07:28:00 GMT"
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+def is_retryable(error: Exception, policy) -> bool:
+    """Retry listed status codes and transient network failures"""
+    status = status_code_of(error)
+    if status in policy.retry_on:
+        return True
+    return type(error).__name__ in _TRANSIENT_ERRORS and (status is None or status >= 500)
+
+
+def backoff_delay(attempt: int, policy) -> float:
+    """Exponential backoff for the given 1-based attempt, with jitter"""
+    delay = min(policy.base_delay * (2 ** (attempt - 1)), policy.max_delay)
+    return delay * (1 - policy.jitter * random.random())
+
+
+def to_api_error(error: Exception, provider: str, attempts: int) -> APIError:
+    """Typed APIError for a provider failure"""
+    if isinstance(error, APIError):
+        return error
+    status = status_code_of(error)
+    retry_after = retry_after_of(error)
+    if status == 429:
+        api_error = rate_limit_error(retry_after)
+        api_error.message = f"{provider}: API rate limit exceeded after {attempts} attempt(s)"
+        return api_error
+    return APIError(
+        f"{provider}: {error}",
+        status_code=status,
+        hint=f"Gave up after {attempts} attempt(s)" if attempts > 1 else None,
+        retry_after=retry_after
+    )
+
+
+async def call_with_retries(
+    fn: Callable[[], Awaitable[Any]],
+    policy,
+    provider: str,
+    can_retry: Callable[[], bool] = lambda: True
+) -> Any:
+    """
+    Await fn(), retrying failures allowed by `policy` (a RetryConfig).
+
+    Waits the provider's Retry-After when given, else exponential backoff
+    with jitter. A Retry-After longer than policy.max_delay is not waited
+    out: the error is raised at once so the caller can reschedule.
+    `can_retry` lets the caller veto a retry (e.g. once tokens have streamed).
+    Raises an APIError carrying status_code and retry_after.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if attempt >= policy.max_attempts or not is_retryable(e, policy) or not can_retry():
+                raise to_api_error(e, provider, attempt) from e
+
+            retry_after = retry_after_of(e)
+            if retry_after is not None and retry_after > policy.max_delay:
+                raise to_api_error(e, provider, attempt) from e
+
+            delay = retry_after if retry_after is not None else backoff_delay(attempt, policy)
+            print(f"⏳ [{provider}] {type(e).__name__} (status {status_code_of(e)}), retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{policy.max_attempts})")
+            await asyncio.sleep(delay)
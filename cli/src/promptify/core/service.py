@@ -1,49 +1,400 @@
 """Business logic for prompt refinement"""
-from typing import Protocol
-from promptify.utils.errors import ServiceError, rate_limit_error, network_error
+import asyncio
+import hashlib
+import json
+import time
+from typing import AsyncIterator, Dict, Iterable, Optional, Protocol, Tuple
+from promptify.utils.errors import PromptifyError, ServiceError, ValidationError, rate_limit_error, network_error
+from promptify.core.providerSelection.config import PromptifyConfig, STAGES
+from promptify.core.providerSelection.providers import aclose_all
+from promptify.core.cache import get_idempotency_cache, get_result_cache, make_cache_key
+from promptify.core.similarity import get_near_duplicate_index
+from promptify.core.metrics import REFINE_DURATION, REFINE_IN_FLIGHT
+from promptify.core.usage import empty_usage, sum_usage
+
+# AgentState fields worth keeping for a repeat refinement
+CACHED_FIELDS = ("intent", "critique", "expert_suggestions", "final_prompt_draft", "truncated")
+
+# Refinement modes: "full" runs the four-agent graph, "fast" one analysis call plus Smith
+REFINE_MODES = ("full", "fast")
+
+# Fields of a result replayed for a repeated Idempotency-Key
+REPLAYED_FIELDS = ("user_query", *CACHED_FIELDS, "usage", "total_usage", "cached", "similarity", "matched_query")
 
 class PromptifyService:
     """Main service orchestrating prompt refinement"""
     
-    def __init__(self, graph):
+    def __init__(self, graph, fast_graph=None):
         self.graph = graph
+        self.graphs = {"full": graph, "fast": fast_graph}
+        # (event loop, request key) -> [running refinement shared by identical requests, waiter count]
+        self._inflight: Dict[tuple, list] = {}
+    
+    def refine(self, query: str, model_provider: str = None, model_name: str = None, api_key: str = None, use_cache: bool = True, idempotency_key: str = None, mode: str = "full", max_tokens: Dict[str, Optional[int]] = None) -> dict:
+        """Refine a prompt using the agent graph (blocking wrapper around arefine)"""
+        async def run():
+            try:
+                return await self.arefine(query, model_provider, model_name, api_key, use_cache, idempotency_key, mode, max_tokens)
+            finally:
+                await aclose_all()  # The loop ends with asyncio.run; close its pooled sockets
+        
+        return asyncio.run(run())
+    
+    async def arefine(self, query: str, model_provider: str = None, model_name: str = None, api_key: str = None, use_cache: bool = True, idempotency_key: str = None, mode: str = "full", max_tokens: Dict[str, Optional[int]] = None) -> dict:
+        """
+        Refine a prompt using the agent graph without blocking the event loop.
+        
+        A recent refinement of the same normalized query with the same
+        provider/model/temperature is returned as-is with `cached: True`.
+        Failing that, a refinement of a near-identical query (similarity at
+        or above cache.near_duplicate_threshold) is reused, and its
+        `similarity` score reported.
+        
+        Identical requests already in flight share one pipeline run. With
+        an `idempotency_key`, a repeat of the same request within
+        cache.idempotency_ttl_seconds returns the stored result; reusing
+        the key for a different request raises ValidationError.
+        
+        `mode` picks the graph: "full" (triage, critic, expert, smith) or
+        "fast" (one analysis call, then smith); results are cached per mode.
+        
+        `max_tokens` overrides the output-token budget of individual stages,
+        e.g. {"smith": 4096}; 0 or None removes the limit. Stages whose
+        reply hit its budget are listed in the result's `truncated`.
+        """
+        graph = self._graph_for(mode)
+        max_tokens = self._check_budgets(max_tokens)
+        cfg = PromptifyConfig.load_or_default()
+        request_key = self._request_key(cfg, query, model_provider, model_name, api_key, use_cache, mode, max_tokens)
+        
+        REFINE_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            if idempotency_key:
+                replay = await self._idempotent_replay(cfg, idempotency_key, request_key)
+                if replay is not None:
+                    outcome = "replayed"
+                    return replay
+            
+            result = await self._single_flight(
+                request_key,
+                lambda: self._arefine(graph, cfg, query, model_provider, model_name, api_key, use_cache, mode, max_tokens)
+            )
+            outcome = "cached" if result.get("cached") else "fresh"
+        finally:
+            REFINE_IN_FLIGHT.dec()
+            REFINE_DURATION.observe(time.perf_counter() - start, outcome=outcome)
+        
+        if idempotency_key:
+            await get_idempotency_cache(cfg.cache).aset(idempotency_key, {
+                "request": request_key,
+                "result": {field: result.get(field) for field in REPLAYED_FIELDS}
+            })
+        return result
+    
+    async def _arefine(self, graph, cfg: PromptifyConfig, query: str, model_provider: str, model_name: str, api_key: str, use_cache: bool, mode: str, max_tokens: Dict[str, Optional[int]]) -> dict:
+        """One pipeline run (or cache hit) behind arefine's coalescing"""
+        cached, remember = await self._cache_lookup(cfg, query, model_provider, model_name, use_cache, mode, max_tokens)
+        if cached is not None:
+            return cached
+        
+        initial_state = self._initial_state(cfg, query, model_provider, model_name, api_key, use_cache, max_tokens=max_tokens)
+        
+        try:
+            result = await graph.ainvoke(initial_state)
+        
+        except Exception as e:
+            raise self._translate_error(e)
+        
+        return await self._finish(result, remember)
+    
+    async def astream(self, query: str, model_provider: str = None, model_name: str = None, api_key: str = None, use_cache: bool = True, mode: str = "full", max_tokens: Dict[str, Optional[int]] = None) -> AsyncIterator[dict]:
+        """
+        Refine a prompt, yielding progress events as they happen.
+        
+        Events are dicts with an "event" key:
+            stage_started                   {"stage"}
+            stage_finished                  {"stage", "elapsed", "output"}
+            token                           {"stage": "smith", "text"}
+            result                          {"result": <same dict arefine returns>}
+        A cache hit yields only the result event. Stages depend on `mode`
+        and budgets on `max_tokens` (see arefine).
+        """
+        graph = self._graph_for(mode)
+        max_tokens = self._check_budgets(max_tokens)
+        cfg = PromptifyConfig.load_or_default()
+        cached, remember = await self._cache_lookup(cfg, query, model_provider, model_name, use_cache, mode, max_tokens)
+        if cached is not None:
+            yield {"event": "result", "result": cached}
+            return
+        
+        initial_state = self._initial_state(cfg, query, model_provider, model_name, api_key, use_cache, stream=True, max_tokens=max_tokens)
+        
+        result = None
+        try:
+            async for kind, chunk in graph.astream(initial_state, stream_mode=["custom", "values"]):
+                if kind == "custom":
+                    yield chunk
+                else:
+                    result = chunk
+        
+        except Exception as e:
+            raise self._translate_error(e)
+        
+        yield {"event": "result", "result": await self._finish(result, remember)}
+    
+    def _graph_for(self, mode: str):
+        """Compiled graph for a refinement mode"""
+        if mode not in REFINE_MODES:
+            raise ValidationError(
+                f"Unknown refinement mode: {mode}",
+                hint=f"Use one of: {', '.join(REFINE_MODES)}"
+            )
+        graph = self.graphs.get(mode)
+        if graph is None:
+            raise ServiceError(f"Refinement mode '{mode}' is not available in this service")
+        return graph
+    
+    @staticmethod
+    def _check_budgets(max_tokens: Optional[Dict[str, Optional[int]]]) -> Dict[str, Optional[int]]:
+        """Validated per-request stage budgets (0 and None both mean no limit)"""
+        budgets = {}
+        for stage, limit in (max_tokens or {}).items():
+            if stage not in STAGES:
+                raise ValidationError(
+                    f"Unknown stage in max_tokens: {stage}",
+                    hint=f"Use one of: {', '.join(STAGES)}"
+                )
+            if limit is not None and limit < 0:
+                raise ValidationError(f"max_tokens for {stage} must be positive (0 = no limit)")
+            budgets[stage] = limit or None
+        return budgets
     
-    def refine(self, query: str, model_provider: str = None, model_name: str = None, api_key: str = None) -> dict:
-        """Refine a prompt using the agent graph"""
-        initial_state = {
+    @staticmethod
+    def _request_key(cfg: PromptifyConfig, query: str, model_provider: str, model_name: str, api_key: str, use_cache: bool, mode: str = "full", max_tokens: Dict[str, Optional[int]] = None) -> str:
+        """Identity of a request: normalized query, provider, model, endpoint, temperature, key, cache, refinement mode and budgets"""
+        provider = model_provider or cfg.model.provider
+        base = make_cache_key(
+            [{"role": "user", "content": query}],
+            model=model_name or cfg.model.model,
+            provider=provider,
+            temperature=cfg.model.temperature,
+            api_base=PromptifyService._api_base(cfg, provider)
+        )
+        # Callers with different keys must not share a run (one key may be invalid)
+        routes = PromptifyService._stage_routes(cfg, max_tokens)
+        return hashlib.sha256(f"{base}|{api_key or ''}|{use_cache}|{mode}|{routes}".encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def _api_base(cfg: PromptifyConfig, provider: str) -> Optional[str]:
+        """Endpoint a request's provider is called at (model.api_base only applies to the configured provider)"""
+        return cfg.model.api_base if provider == cfg.model.provider else None
+    
+    @staticmethod
+    def _stage_routes(cfg: PromptifyConfig, max_tokens: Dict[str, Optional[int]] = None) -> str:
+        """Short digest of the per-stage model routing and output-token budgets"""
+        routes = {name: override.model_dump(exclude_none=True) for name, override in cfg.model.stages.items()}
+        budgets = {stage: cfg.model.stage_route(stage)["max_tokens"] for stage in STAGES}
+        budgets.update(max_tokens or {})
+        blob = json.dumps({"routes": routes, "max_tokens": budgets}, sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+    
+    async def _single_flight(self, request_key: str, run) -> dict:
+        """
+        Attach to an identical in-flight run, or start one; each caller gets
+        its own copy. The run is cancelled once its last caller is.
+        """
+        key = (asyncio.get_running_loop(), request_key)
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(run())
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda _: self._forget_inflight(key, entry))
+        task = entry[0]
+        
+        entry[1] += 1
+        try:
+            # Shielded: one caller disconnecting must not cancel the run for the others
+            return dict(await asyncio.shield(task))
+        except asyncio.CancelledError:
+            if entry[1] == 1:
+                # Nobody else is waiting: stop spending provider calls on it
+                task.cancel()
+                self._forget_inflight(key, entry)
+            raise
+        finally:
+            entry[1] -= 1
+    
+    def _forget_inflight(self, key: tuple, entry: list) -> None:
+        """Drop a finished or abandoned run, unless a newer one already took its key"""
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+    
+    @staticmethod
+    async def _idempotent_replay(cfg: PromptifyConfig, idempotency_key: str, request_key: str):
+        """Stored result for a repeated Idempotency-Key, or None"""
+        stored = await get_idempotency_cache(cfg.cache).aget(idempotency_key)
+        if stored is None:
+            return None
+        if stored["request"] != request_key:
+            raise ValidationError(
+                "Idempotency-Key was already used for a different request",
+                hint="Send a new Idempotency-Key for each distinct prompt"
+            )
+        return dict(stored["result"])
+    
+    def _initial_state(self, cfg: PromptifyConfig, query: str, model_provider: str, model_name: str, api_key: str, use_cache: bool, stream: bool = False, max_tokens: Dict[str, Optional[int]] = None) -> dict:
+        return {
             "user_query": query,
             "model_config": {
                 "provider": model_provider,
                 "model": model_name,
-                "api_key": api_key
+                "api_key": api_key,
+                "cache": use_cache,
+                "stream": stream,
+                "max_tokens": max_tokens or {}
             },
+            "config": cfg,
             "intent": "",
             "critique": None,
             "expert_suggestions": "",
             "final_prompt_draft": "",
-            "iteration_count": 0
+            "iteration_count": 0,
+            "usage": {}
         }
+    
+    async def _cache_lookup(self, cfg: PromptifyConfig, query: str, model_provider: str, model_name: str, use_cache: bool, mode: str = "full", max_tokens: Dict[str, Optional[int]] = None):
+        """
+        Look the query up in the result cache (exact, then near-duplicate
+        when cache.near_duplicate_threshold is set).
+        
+        Returns (cached_result, remember): cached_result is None on a miss,
+        and `await remember(result)` stores a fresh result (None if caching
+        is off). A near-duplicate hit reports the query it was refined for
+        as `matched_query`.
+        """
+        if not (use_cache and cfg.model.cache):
+            return None, None
+        
+        model = model_name or cfg.model.model
+        provider = model_provider or cfg.model.provider
+        api_base = self._api_base(cfg, provider)
+        namespace = f"{provider}|{model}|{cfg.model.temperature}"
+        if api_base:
+            namespace += f"|{api_base}"
+        if mode != "full":
+            namespace += f"|{mode}"  # Full-mode keys predate modes; keep them stable
+        routes = self._stage_routes(cfg, max_tokens)
+        namespace += f"|stages:{routes}"
+        
+        result_cache = get_result_cache(cfg.cache)
+        cache_key = make_cache_key(
+            [{"role": "user", "content": query}],
+            model=model,
+            provider=provider,
+            temperature=cfg.model.temperature,
+            api_base=api_base
+        )
+        if mode != "full":
+            cache_key = f"{mode}:{cache_key}"
+        cache_key = f"stages:{routes}:{cache_key}"
+        cached = await result_cache.aget(cache_key)
+        if cached is not None:
+            return {"user_query": query, **cached, "usage": {}, "total_usage": empty_usage(), "cached": True, "similarity": 1.0}, None
+        
+        near_index = None
+        if cfg.cache.near_duplicate_threshold is not None:
+            near_index = get_near_duplicate_index(cfg.cache)
+            # Signing is O(query length) pure Python; keep it off the event loop
+            match = await asyncio.to_thread(near_index.query, query, namespace, cfg.cache.near_duplicate_threshold)
+            if match is not None:
+                match_key, similarity, matched_query = match
+                cached = await result_cache.aget(match_key)
+                if cached is not None:
+                    return {"user_query": query, **cached, "usage": {}, "total_usage": empty_usage(), "cached": True,
+                            "similarity": similarity, "matched_query": matched_query}, None
+        
+        async def remember(result: dict) -> None:
+            await result_cache.aset(cache_key, {field: result.get(field) for field in CACHED_FIELDS})
+            if near_index is not None:
+                await asyncio.to_thread(near_index.add, cache_key, query, namespace)
+        
+        return None, remember
+    
+    async def _finish(self, result: dict, remember) -> dict:
+        """Store a fresh graph result in the cache, total its usage and flag it"""
+        # Stages whose reply stopped at its max_tokens budget
+        result["truncated"] = [stage for stage, usage in result.get("usage", {}).items() if usage.get("truncated")]
+        if remember is not None:
+            await remember(result)
+        
+        result["total_usage"] = sum_usage(result.get("usage", {}).values())
+        result["cached"] = False
+        return result
+    
+    async def arefine_many(self, items: Iterable[Tuple[str, str]], concurrency: int = 8, **options) -> AsyncIterator[dict]:
+        """
+        Refine many (id, query) pairs with at most `concurrency` in flight.
+        
+        Yields {"id", "result"} or {"id", "error"} in completion order. Items
+        are pulled lazily, so memory stays flat however long `items` is.
+        Extra keyword arguments are forwarded to arefine.
+        """
+        async def run(item_id: str, query: str) -> dict:
+            try:
+                return {"id": item_id, "result": await self.arefine(query, **options)}
+            except Exception as e:
+                return {"id": item_id, "error": str(e)}
+        
+        items = iter(items)
+        pending = set()
+        exhausted = False
         
         try:
-            return self.graph.invoke(initial_state)
+            while True:
+                while not exhausted and len(pending) < concurrency:
+                    try:
+                        item_id, query = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(run(item_id, query)))
+                
+                if not pending:
+                    return
+                
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # The consumer stopped early (break, error, cancellation): don't leave refinements running
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+    
+    @staticmethod
+    def _translate_error(e: Exception) -> Exception:
+        """Map a raw agent failure onto a user-facing Promptify error"""
+        if isinstance(e, PromptifyError):
+            return e  # Already typed (e.g. APIError from call_llm's retries)
         
-        except Exception as e:
-            error_message = str(e).lower()
-            
-            # Handle specific error types
-            if "429" in error_message or "rate limit" in error_message:
-                raise rate_limit_error()
-            
-            elif "network" in error_message or "connection" in error_message:
-                raise network_error()
-            
-            elif "api key" in error_message or "authentication" in error_message:
-                from promptify.utils.errors import api_key_missing_error
-                raise api_key_missing_error()
-            
-            else:
-                # Generic service error
-                raise ServiceError(
-                    f"Agent processing failed: {e}",
-                    hint="Try running with --verbose to see more details"
-                )
+        error_message = str(e).lower()
+        
+        # Handle specific error types
+        if "429" in error_message or "rate limit" in error_message:
+            return rate_limit_error()
+        
+        elif "network" in error_message or "connection" in error_message:
+            return network_error()
+        
+        elif "api key" in error_message or "authentication" in error_message:
+            from promptify.utils.errors import api_key_missing_error
+            return api_key_missing_error()
+        
+        else:
+            # Generic service error
+            return ServiceError(
+                f"Agent processing failed: {e}",
+                hint="Try running with --verbose to see more details"
+            )
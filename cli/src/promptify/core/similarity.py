@@ -0,0 +1,229 @@
+"""
+Near-duplicate query detection
+MinHash signatures over character shingles, indexed with LSH banding.
+Pure Python, no embedding service.
+
+Character similarity can't tell "sort ascending" from "sort descending"
+(Jaccard 0.92), so a match is only reused when the token-level diff is
+harmless (see same_meaning).
+"""
+
+import re
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+_MAX_HASH = (1 << 32) - 1
+_EMPTY = _MAX_HASH + 1
+_GOLDEN = 0x9E3779B1  # Spreads densified bins apart
+
+
+def _mix32(h: int) -> int:
+    """MurmurHash3 finalizer: crc32 alone is linear, so similar shingles collide in patterns"""
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & _MAX_HASH
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & _MAX_HASH
+    h ^= h >> 16
+    return h
+
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[._][a-z0-9]+)*")
+_NUMBER = re.compile(r"\d")
+
+# Words that flip a request when they are all that differs
+_NEGATIONS = frozenset({
+    "not", "no", "never", "without", "dont", "don", "doesnt", "isnt", "cant", "cannot",
+    "shouldnt", "wont", "none", "nor", "except", "avoid", "exclude", "excluding", "non",
+})
+_OPPOSITES = [
+    ("ascending", "descending"), ("asc", "desc"), ("increase", "decrease"), ("increasing", "decreasing"),
+    ("min", "max"), ("minimum", "maximum"), ("minimize", "maximize"), ("before", "after"),
+    ("add", "remove"), ("enable", "disable"), ("true", "false"), ("yes", "no"), ("up", "down"),
+    ("left", "right"), ("upper", "lower"), ("uppercase", "lowercase"), ("first", "last"),
+    ("start", "end"), ("open", "close"), ("on", "off"), ("include", "exclude"), ("allow", "deny"),
+    ("accept", "reject"), ("sync", "async"), ("synchronous", "asynchronous"), ("input", "output"),
+    ("read", "write"), ("encrypt", "decrypt"), ("encode", "decode"), ("import", "export"),
+    ("client", "server"), ("frontend", "backend"), ("push", "pull"), ("more", "less"),
+    ("fast", "slow"), ("big", "small"), ("large", "small"), ("long", "short"), ("high", "low"),
+    ("public", "private"), ("horizontal", "vertical"), ("inner", "outer"), ("upload", "download"),
+    ("serialize", "deserialize"), ("compress", "decompress"), ("lock", "unlock"), ("show", "hide"),
+]
+_OPPOSITE_OF = {}
+for _a, _b in _OPPOSITES:
+    _OPPOSITE_OF.setdefault(_a, set()).add(_b)
+    _OPPOSITE_OF.setdefault(_b, set()).add(_a)
+
+
+def tokens(text: str) -> List[str]:
+    """Lower-cased word/number tokens (apostrophes dropped, so "don't" is "dont")"""
+    return _TOKEN.findall(text.lower().replace("'", "").replace("\u2019", ""))
+
+
+def same_meaning(a: str, b: str) -> bool:
+    """
+    Whether the token-level diff of two similar queries is safe to ignore:
+    the same numbers (ports, versions, sizes) and no negation or
+    opposite-word swap among the tokens that differ.
+    """
+    tokens_a, tokens_b = tokens(a), tokens(b)
+    if sorted(t for t in tokens_a if _NUMBER.search(t)) != sorted(t for t in tokens_b if _NUMBER.search(t)):
+        return False
+    only_a, only_b = set(tokens_a) - set(tokens_b), set(tokens_b) - set(tokens_a)
+    if (only_a | only_b) & _NEGATIONS:
+        return False
+    return not any(_OPPOSITE_OF.get(token, set()) & only_b for token in only_a)
+
+
+def shingles(text: str, size: int = 5) -> set:
+    """Character shingles of the lower-cased, whitespace-collapsed text"""
+    normalized = " ".join(text.lower().split())
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index mapping query text to an opaque key.
+
+    Lookups only compare against the entries sharing one of the query's
+    `bands` buckets, but signing the query is O(length) pure Python (about
+    1-2ms for a typical query, tens of ms for a multi-KB prompt), so callers
+    on an event loop should run add/query in a worker thread. Each entry
+    keeps its text for the same_meaning check, so memory grows with
+    `max_entries` (roughly 2KB per entry plus the text); the oldest
+    entries are evicted first.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_size: int = 5, max_entries: int = 10_000):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, Tuple[str, array, str]]" = OrderedDict()
+        # Most buckets hold a single key, so store a bare str until a second arrives
+        self._buckets: Dict[int, Union[str, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def signature(self, text: str) -> array:
+        """
+        MinHash signature (num_perm 32-bit values) of the text's shingles.
+
+        Uses one-permutation hashing: each shingle is hashed once and lands
+        in one of num_perm bins, keeping the bin minimum. Empty bins borrow
+        from the next filled bin (rotation densification). This is
+        O(shingles) rather than O(shingles * num_perm).
+        """
+        n = self.num_perm
+        bins = [_EMPTY] * n
+        for s in shingles(text, self.shingle_size):
+            h = _mix32(zlib.crc32(s.encode("utf-8")))
+            i = h % n
+            v = h // n
+            if v < bins[i]:
+                bins[i] = v
+
+        filled = list(bins)
+        for i in range(n):
+            if bins[i] != _EMPTY:
+                continue
+            for offset in range(1, n):
+                donor = bins[(i + offset) % n]
+                if donor != _EMPTY:
+                    filled[i] = (donor + offset * _GOLDEN) & _MAX_HASH
+                    break
+        return array("I", filled)
+
+    def _band_keys(self, namespace: str, sig: array) -> List[int]:
+        return [
+            hash((namespace, band, tuple(sig[band * self.rows:(band + 1) * self.rows])))
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def similarity(sig_a: array, sig_b: array) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+    def add(self, key: str, text: str, namespace: str = "") -> None:
+        """Index `text` under `key`; queries only match within the same namespace"""
+        sig = self.signature(text)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (namespace, sig, text)
+            for band_key in self._band_keys(namespace, sig):
+                bucket = self._buckets.get(band_key)
+                if bucket is None:
+                    self._buckets[band_key] = key
+                elif isinstance(bucket, str):
+                    self._buckets[band_key] = [bucket, key]
+                else:
+                    bucket.append(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        namespace, sig, _ = self._entries.pop(key)
+        for band_key in self._band_keys(namespace, sig):
+            bucket = self._buckets.get(band_key)
+            if bucket is None:
+                continue
+            if isinstance(bucket, str):
+                if bucket == key:
+                    del self._buckets[band_key]
+                continue
+            if key in bucket:
+                bucket.remove(key)
+            if len(bucket) == 1:
+                self._buckets[band_key] = bucket[0]
+
+    def query(self, text: str, namespace: str = "", threshold: float = 0.9) -> Optional[Tuple[str, float, str]]:
+        """
+        Best (key, similarity, indexed text) at or above `threshold` whose
+        text also passes same_meaning, or None
+        """
+        sig = self.signature(text)
+        matches = []
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(namespace, sig):
+                bucket = self._buckets.get(band_key)
+                if isinstance(bucket, str):
+                    candidates.add(bucket)
+                elif bucket:
+                    candidates.update(bucket)
+            for key in candidates:
+                entry_namespace, entry_sig, entry_text = self._entries[key]
+                if entry_namespace != namespace:
+                    continue  # Band-key hash collision across namespaces
+                score = self.similarity(sig, entry_sig)
+                if score >= threshold:
+                    matches.append((key, score, entry_text))
+        for match in sorted(matches, key=lambda m: m[1], reverse=True):
+            if same_meaning(text, match[2]):
+                return match
+        return None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_index: Optional[NearDuplicateIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index(settings) -> NearDuplicateIndex:
+    """Process-wide index of refined queries, built from a CacheConfig"""
+    global _index
+    with _index_lock:
+        if _index is None or _index.max_entries != settings.near_duplicate_max_entries:
+            _index = NearDuplicateIndex(max_entries=settings.near_duplicate_max_entries)
+        return _index
@@ -0,0 +1,71 @@
+"""
+Token usage and estimated cost accounting
+Provider calls record into the usage of the stage they run in; stages and
+results carry {prompt_tokens, completion_tokens, total_tokens, cost, calls, truncated}
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Iterator, Optional
+
+_current_usage: ContextVar[Optional[dict]] = ContextVar("promptify_stage_usage", default=None)
+
+
+def empty_usage() -> dict:
+    return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0, "calls": 0, "truncated": 0}
+
+
+def add_usage(total: dict, usage: Optional[dict]) -> dict:
+    """Add `usage` into `total` in place and return it"""
+    if not usage:
+        return total
+    for field in ("prompt_tokens", "completion_tokens", "total_tokens", "calls", "truncated"):
+        total[field] += usage.get(field, 0) or 0
+    total["cost"] = round(total["cost"] + (usage.get("cost") or 0.0), 8)
+    return total
+
+
+def sum_usage(usages: Iterable[Optional[dict]]) -> dict:
+    """Total of several usage records (e.g. every stage of a refine)"""
+    total = empty_usage()
+    for usage in usages:
+        add_usage(total, usage)
+    return total
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD cost from litellm's price table; 0.0 for models it doesn't know (e.g. local)"""
+    import litellm
+    try:
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        )
+    except Exception:
+        return 0.0
+    return prompt_cost + completion_cost
+
+
+@contextmanager
+def collect_usage() -> Iterator[dict]:
+    """Collect the usage of every provider call made inside the block (and its tasks)"""
+    usage = empty_usage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def record_usage(model: str, prompt_tokens: int, completion_tokens: int, truncated: bool = False) -> None:
+    """Add one provider call (truncated: stopped at its max_tokens) to the enclosing collect_usage() block, if any"""
+    usage = _current_usage.get()
+    if usage is None:
+        return
+    add_usage(usage, {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "cost": estimate_cost(model, prompt_tokens, completion_tokens),
+        "calls": 1,
+        "truncated": int(truncated),
+    })
@@ -3,6 +3,8 @@ Custom exceptions for Promptify CLI
 Provides clear, actionable error messages for users
 """
 
+import math
+
 
 class PromptifyError(Exception):
     """Base exception for all Promptify errors"""
@@ -36,8 +38,9 @@ class ConfigurationError(PromptifyError):
 class APIError(PromptifyError):
     """Raised when external API calls fail"""
     
-    def __init__(self, message: str, status_code: int = None, hint: str = None):
+    def __init__(self, message: str, status_code: int = None, hint: str = None, retry_after: float = None):
         self.status_code = status_code
+        self.retry_after = retry_after  # Seconds the provider asked us to wait, if it said
         super().__init__(message, hint)
     
     def __str__(self):
@@ -82,18 +85,19 @@ def file_not_found_error(file_path: str):
     )
 
 
-def rate_limit_error(retry_after: int = None):
+def rate_limit_error(retry_after: float = None):
     """Standard error for API rate limiting"""
     hint = "You've hit the API rate limit."
     if retry_after:
-        hint += f" Try again in {retry_after} seconds."
+        hint += f" Try again in {math.ceil(retry_after)} seconds."
     else:
         hint += " Wait a moment and try again."
     
     return APIError(
         "API rate limit exceeded",
         status_code=429,
-        hint=hint
+        hint=hint,
+        retry_after=retry_after
     )
 
 
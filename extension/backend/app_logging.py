@@ -7,8 +7,8 @@ def setup_logging(name="promptify_backend"):
     """
     Configures and returns a logger with concurrent file handling and console output.
     """
-    # Ensure log directory exists
-    log_dir = "logs"
+    # Ensure log directory exists (PROMPTIFY_LOG_DIR overrides ./logs)
+    log_dir = os.getenv("PROMPTIFY_LOG_DIR", "logs")
     os.makedirs(log_dir, exist_ok=True)
     log_file = os.path.join(log_dir, "app.log")
 
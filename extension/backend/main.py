@@ -1,22 +1,55 @@
-import os
 import sys
-from typing import Optional, Dict, Any
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import contextlib
+import json
+import math
+from typing import Optional, Dict, Any, List, Literal
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from app_logging import logger
 from promptify.core.service import PromptifyService
-from promptify.agent.graph import promptify
+from promptify.agent.graph import promptify, get_fast_graph
+from promptify.core.providerSelection.config import PromptifyConfig
+from promptify.core.providerSelection.providers import aclose_all, get_pool_stats
+from promptify.core.cache import get_llm_cache, get_result_cache
+from promptify.core.hedge import get_hedge_stats
+from promptify.core.intent import get_triage_stats
+from promptify.core.metrics import render_metrics
+from promptify.core.providerSelection.ratelimit import get_rate_limit_stats
+from promptify.utils.errors import APIError, ValidationError
 
-app = FastAPI(title="Promptify Cloud API")
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await aclose_all()  # Close pooled provider connections on shutdown
+
+
+app = FastAPI(title="Promptify Cloud API", lifespan=lifespan)
 
 # Initialize the service
-service = PromptifyService(graph=promptify)
+service = PromptifyService(graph=promptify, fast_graph=get_fast_graph())
 
 class RefineRequest(BaseModel):
     prompt: str
-    model_provider: str = "cerebras" # cerebras, openai, etc.
+    model_provider: Optional[str] = None # cerebras, openai, etc.; None = server config (incl. per-stage routing)
     model_name: Optional[str] = None
     api_key: Optional[str] = None # Optional, user can provide their own
+    mode: Literal["full", "fast"] = "full" # fast: one analysis call + Smith instead of four agents
+    max_tokens: Optional[Dict[str, Optional[int]]] = None # Per-stage output budgets, e.g. {"smith": 4096}
+
+
+MAX_BATCH_SIZE = 100
+MAX_BATCH_CONCURRENCY = 16
+
+class BatchRefineRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    model_provider: Optional[str] = None
+    model_name: Optional[str] = None
+    api_key: Optional[str] = None
+    mode: Literal["full", "fast"] = "full"
+    max_tokens: Optional[Dict[str, Optional[int]]] = None
+    concurrency: int = Field(4, ge=1, le=MAX_BATCH_CONCURRENCY)
 
 
 logger.info("Starting Promptify Cloud API...")
@@ -24,49 +57,189 @@ logger.info("Starting Promptify Cloud API...")
 class RefineResponse(BaseModel):
     refined_prompt: str
     original_prompt: str
+    cached: bool = False
+    similarity: Optional[float] = None
+    matched_query: Optional[str] = None             # Near-duplicate hit: the query the cached refinement was made for
+    usage: Optional[Dict[str, Any]] = None          # Tokens and estimated cost, summed over stages
+    stage_usage: Dict[str, Dict[str, Any]] = {}     # Per stage: triage, critic, expert, smith (fast mode: analyze, smith)
+    truncated: List[str] = []                       # Stages whose output stopped at its max_tokens budget
 
 @app.get("/health")
 def health_check():
     return {"status": "ok", "service": "promptify-cloud"}
 
+@app.post("/config/reload")
+def reload_config():
+    """
+    Re-read the server config from disk.
+    Edits are already picked up on the next request (the cache is keyed on
+    file mtime); this forces it, e.g. after replacing the file in place.
+    """
+    cfg = PromptifyConfig.reload()
+    logger.info(f"Config reloaded: {cfg.model.provider}/{cfg.model.model}")
+    return {"status": "reloaded", "provider": cfg.model.provider, "model": cfg.model.model}
+
+@app.get("/stats")
+def stats():
+    """Connection-pool, cache, hedging, rate-limit and triage counters for this process"""
+    cfg = PromptifyConfig.load_or_default()
+    return {
+        "pool": get_pool_stats(),
+        "hedge": get_hedge_stats(),
+        "rate_limit": get_rate_limit_stats(),
+        "triage": get_triage_stats(),
+        "cache": {
+            "llm": get_llm_cache(cfg.cache).stats(),
+            "results": get_result_cache(cfg.cache).stats(),
+        },
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per-stage and per-provider latency histograms, error counts and in-flight gauges (Prometheus format)"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/refine", response_model=RefineResponse)
-async def refine_prompt(request: RefineRequest):
+async def refine_prompt(request: RefineRequest, idempotency_key: Optional[str] = Header(None)):
     """
     Refines the given prompt using the Promptify Agentic workflow.
+    Identical concurrent requests share one run; an `Idempotency-Key`
+    header makes client retries return the stored result.
     """
     try:
-        # Set API key if provided
-        if request.api_key:
-            # Set the appropriate env var based on provider
-            key_name = f"{request.model_provider.upper()}_API_KEY"
-            os.environ[key_name] = request.api_key
-        
-        # Use the service to refine the prompt
-        result = service.refine(
+        # The caller's key travels with the request (model_config -> provider),
+        # never through os.environ, so concurrent users can't see each other's keys.
+        # Await the service so the event loop stays free while the provider works
+        result = await service.arefine(
             query=request.prompt,
             model_provider=request.model_provider,
             model_name=request.model_name,
-            api_key=request.api_key
+            api_key=request.api_key,
+            idempotency_key=idempotency_key,
+            mode=request.mode,
+            max_tokens=request.max_tokens
         )
         
         refined = result.get('final_prompt_draft', 'Error: No refined prompt generated')
         
         return RefineResponse(
             refined_prompt=refined,
-            original_prompt=request.prompt
+            original_prompt=request.prompt,
+            cached=result.get("cached", False),
+            similarity=result.get("similarity"),
+            matched_query=result.get("matched_query"),
+            usage=result.get("total_usage"),
+            stage_usage=result.get("usage") or {},
+            truncated=result.get("truncated") or []
         )
 
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    except APIError as e:
+        # Pass provider rate limits through so clients can back off
+        if e.status_code == 429:
+            headers = {"Retry-After": str(math.ceil(e.retry_after))} if e.retry_after else None
+            raise HTTPException(status_code=429, detail=str(e), headers=headers)
+        raise HTTPException(status_code=500, detail=str(e))
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/refine/stream")
+async def refine_stream(request: RefineRequest):
+    """
+    Refines a prompt, streaming progress as Server-Sent Events:
+    `stage_started` / `stage_finished` per agent, `token` for each chunk of
+    the final prompt, then `result` (the /refine response) or `error`.
+    """
+    async def stream():
+        try:
+            async for event in service.astream(
+                query=request.prompt,
+                model_provider=request.model_provider,
+                model_name=request.model_name,
+                api_key=request.api_key,
+                mode=request.mode,
+                max_tokens=request.max_tokens
+            ):
+                name = event.pop("event")
+                if name == "result":
+                    result = event["result"]
+                    event = RefineResponse(
+                        refined_prompt=result.get('final_prompt_draft', 'Error: No refined prompt generated'),
+                        original_prompt=request.prompt,
+                        cached=result.get("cached", False),
+                        similarity=result.get("similarity"),
+                        matched_query=result.get("matched_query"),
+                        usage=result.get("total_usage"),
+                        stage_usage=result.get("usage") or {},
+                        truncated=result.get("truncated") or []
+                    ).model_dump()
+                yield sse_event(name, event)
+        except Exception as e:
+            logger.error(f"Streaming refinement error: {str(e)}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/refine/batch")
+async def refine_batch(request: BatchRefineRequest):
+    """
+    Refines many prompts concurrently (at most `concurrency` at once).
+    Streams one NDJSON line per prompt in completion order; `id` is the
+    prompt's index in the request. A failed prompt yields an `error` line
+    instead of failing the batch.
+    """
+    logger.info(f"Batch refine: {len(request.prompts)} prompts, concurrency {request.concurrency}")
+
+    async def stream():
+        items = ((str(i), prompt) for i, prompt in enumerate(request.prompts))
+        async for item in service.arefine_many(
+            items,
+            concurrency=request.concurrency,
+            model_provider=request.model_provider,
+            model_name=request.model_name,
+            api_key=request.api_key,
+            mode=request.mode,
+            max_tokens=request.max_tokens
+        ):
+            if "error" in item:
+                logger.error(f"Batch item {item['id']} failed: {item['error']}")
+                line = {"id": item["id"], "error": item["error"]}
+            else:
+                result = item["result"]
+                line = {
+                    "id": item["id"],
+                    "refined_prompt": result.get('final_prompt_draft', 'Error: No refined prompt generated'),
+                    "original_prompt": request.prompts[int(item["id"])],
+                    "cached": result.get("cached", False),
+                    "similarity": result.get("similarity"),
+                    "matched_query": result.get("matched_query"),
+                    "usage": result.get("total_usage"),
+                    "truncated": result.get("truncated") or []
+                }
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
 # --- Appwrite Function Entrypoint ---
-def main(context):
+async def main(context):
     """
-    Appwrite Function Entrypoint.
+    Appwrite Function Entrypoint (async, so refinement runs on the runtime's event loop).
     Docs: https://appwrite.io/docs/products/functions/development
     """
     # 1. Log Start
@@ -96,23 +269,26 @@ def main(context):
             if not prompt_text:
                  return context.res.json({"error": "Missing 'prompt' field"}, 400)
 
-            model_provider = body.get("model_provider", "cerebras")
+            model_provider = body.get("model_provider")
             model_name = body.get("model_name")
             api_key = body.get("api_key")
+            mode = body.get("mode", "full")
 
-            # Set API Key in Env (for this execution only)
-            if api_key:
-                key_name = f"{model_provider.upper()}_API_KEY"
-                os.environ[key_name] = api_key
+            logger.info(f"Refining prompt with provider: {model_provider or 'server config'}")
 
-            logger.info(f"Refining prompt with provider: {model_provider}")
+            # Appwrite lower-cases header names
+            headers = getattr(context.req, "headers", None) or {}
+            idempotency_key = headers.get("idempotency-key")
 
             # Call Service
-            result = service.refine(
+            result = await service.arefine(
                 query=prompt_text,
                 model_provider=model_provider,
                 model_name=model_name,
-                api_key=api_key
+                api_key=api_key,
+                idempotency_key=idempotency_key,
+                mode=mode,
+                max_tokens=body.get("max_tokens")
             )
             
             refined = result.get('final_prompt_draft', 'Error: No refined prompt generated')
@@ -121,9 +297,18 @@ def main(context):
 
             return context.res.json({
                 "refined_prompt": refined,
-                "original_prompt": prompt_text
+                "original_prompt": prompt_text,
+                "cached": result.get("cached", False),
+                "similarity": result.get("similarity"),
+                "matched_query": result.get("matched_query"),
+                "usage": result.get("total_usage"),
+                "stage_usage": result.get("usage") or {},
+                "truncated": result.get("truncated") or []
             })
 
+        except ValidationError as e:
+            return context.res.json({"error": str(e)}, 422)
+
         except Exception as e:
             logger.error(f"Refinement Error: {str(e)}")
             return context.res.json({"error": str(e)}, 500)